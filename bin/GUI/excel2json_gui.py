@@ -2,15 +2,16 @@
 # encoding: utf-8
 
 import wx
-import pandas as pd
 import os
-import json
-import re
-import aiofiles
-import asyncio
-from concurrent.futures import ThreadPoolExecutor
+import sys
 import logging
 from datetime import datetime
+from functools import partial
+
+# 使用 bin 目录中的公共模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from stage_timer import timer
+from gui_engine import BackgroundJob, excel_to_json, format_seconds
 
 # Configure logging
 log_dir = '/Users/bigyang/myapp/yiheyuan/log/'
@@ -18,82 +19,6 @@ os.makedirs(log_dir, exist_ok=True)
 log_file = os.path.join(log_dir, f'excel2json_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log')
 logging.basicConfig(filename=log_file, level=logging.ERROR, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# Function to clean filenames
-def clean_filename(filename):
-    filename = re.sub(r'[\u200B-\u200D\uFEFF]', '', filename)
-    filename = re.sub(r'[^\w\s-]', '', filename)
-    filename = filename.strip()
-    return filename
-
-# Function to clean strings
-def clean_string(s):
-    if isinstance(s, str):
-        s = re.sub(r'[\u200B-\u200D\uFEFF]', '', s)  # Remove invisible characters
-        s = re.sub(r'^\s+|\s+$', '', s)  # Remove leading and trailing whitespace
-    return s
-
-# Async function to write JSON
-async def write_json(file_name, row_dict, output_dir):
-    json_file_path = os.path.join(output_dir, f'{file_name}.json')
-    async with aiofiles.open(json_file_path, 'w', encoding='utf-8') as json_file:
-        await json_file.write(json.dumps(row_dict, ensure_ascii=False, indent=4))
-
-# Function to process each row
-def process_row(index, row):
-    try:
-        row_dict = {key: clean_string(value) for key, value in row.to_dict().items()}
-        file_name = row_dict.get('总登记号', f'row_{index+1}')
-        file_name = clean_filename(file_name)
-        return file_name, row_dict
-    except Exception as e:
-        logging.error(f"Error processing row {index}: {e}")
-        return None, None
-
-# Main function to process Excel data
-async def process_excel(file_path, output_dir, progress_callback):
-    batch_size = 100
-    total_records = 0
-    file_extension = os.path.splitext(file_path)[1].lower()
-
-    try:
-        if file_extension == '.xlsx':
-            data = pd.read_excel(file_path, engine='openpyxl', dtype=str)
-            total_records = len(data)
-            headers = data.columns.tolist()
-
-            def read_chunk(start, end):
-                return data.iloc[start:end]
-
-        elif file_extension == '.xls':
-            data = pd.read_excel(file_path, engine='xlrd', dtype=str)
-            total_records = len(data)
-            headers = data.columns.tolist()
-
-            def read_chunk(start, end):
-                return data.iloc[start:end]
-
-        else:
-            raise ValueError("不支持的文件格式！请选择 xls 或者 xlsx 文件！")
-
-        with ThreadPoolExecutor(max_workers=4) as executor:
-            loop = asyncio.get_event_loop()
-            tasks = []
-            for chunk_start in range(0, total_records, batch_size):
-                chunk_end = min(chunk_start + batch_size, total_records)
-                chunk = read_chunk(chunk_start, chunk_end)
-
-                for index, row in chunk.iterrows():
-                    file_name, row_dict = await loop.run_in_executor(executor, process_row, index, row)
-                    if file_name is not None:
-                        tasks.append(write_json(file_name, row_dict, output_dir))
-                        progress_callback(chunk_start, total_records)
-
-            await asyncio.gather(*tasks)
-
-    except Exception as e:
-        logging.error(f"Error processing Excel file: {e}")
-        raise
-
 # GUI part
 class MyApp(wx.App):
     def OnInit(self):
@@ -105,6 +30,10 @@ class MyFrame(wx.Frame):
     def __init__(self, *args, **kw):
         super(MyFrame, self).__init__(*args, **kw, size=(800, 600))  # Increase window size
 
+        # 正在执行的后台转换
+        self.job = None
+        self.all_sheets = False
+
         panel = wx.Panel(self)
         vbox = wx.BoxSizer(wx.VERTICAL)
 
@@ -118,13 +47,26 @@ class MyFrame(wx.Frame):
         self.output_dir_picker = wx.DirPickerCtrl(panel, message="选择 JSON 文件的保存目录")
         vbox.Add(self.output_dir_picker, proportion=0, flag=wx.EXPAND | wx.ALL, border=10)
 
+        self.all_sheets_checkbox = wx.CheckBox(panel, label="转换所有工作表（每个工作表保存到单独的子目录）")
+        vbox.Add(self.all_sheets_checkbox, proportion=0, flag=wx.ALL, border=10)
+
+        hbox = wx.BoxSizer(wx.HORIZONTAL)
         self.start_button = wx.Button(panel, label="开始处理")
-        vbox.Add(self.start_button, proportion=0, flag=wx.CENTER | wx.ALL, border=10)
+        hbox.Add(self.start_button, proportion=0, flag=wx.ALL, border=5)
         self.start_button.Bind(wx.EVT_BUTTON, self.on_start)
+        self.cancel_button = wx.Button(panel, label="取消")
+        hbox.Add(self.cancel_button, proportion=0, flag=wx.ALL, border=5)
+        self.cancel_button.Bind(wx.EVT_BUTTON, self.on_cancel)
+        self.cancel_button.Disable()
+        vbox.Add(hbox, proportion=0, flag=wx.CENTER | wx.ALL, border=5)
 
         self.progress_bar = wx.Gauge(panel, range=100, size=(500, 30))  # Increase progress bar size
         vbox.Add(self.progress_bar, proportion=0, flag=wx.EXPAND | wx.ALL, border=10)
 
+        # 进度说明：已处理数量、速度、预计剩余时间
+        self.status_text = wx.StaticText(panel, label="")
+        vbox.Add(self.status_text, proportion=0, flag=wx.EXPAND | wx.ALL, border=10)
+
         panel.SetSizer(vbox)
         panel.Layout()
 
@@ -133,32 +75,86 @@ class MyFrame(wx.Frame):
 
         self.Bind(wx.EVT_CLOSE, self.on_close)
 
-    def update_progress(self, current, total):
-        percentage = int((current / total) * 100)
-        self.progress_bar.SetValue(percentage)
+    # 更新进度（后台线程通过 wx.CallAfter 调用，已按时间间隔节流）
+    def update_progress(self, progress):
+        unit = '个工作表' if self.all_sheets else '行'
+        if progress['total']:
+            self.progress_bar.SetValue(int(progress['done'] * 100 / progress['total']))
+            text = f"已处理 {progress['done']} / {progress['total']} {unit}"
+        else:
+            # 工作表没有记录行数（部分程序生成的文件），只显示已处理的数量
+            self.progress_bar.Pulse()
+            text = f"已处理 {progress['done']} {unit}"
+        text += f"，每秒 {progress['items_per_second']:.0f} 行，已用时 {format_seconds(progress['elapsed'])}"
+        if progress['eta'] is not None and progress['done'] < progress['total']:
+            text += f"，预计剩余 {format_seconds(progress['eta'])}"
+        if progress['errors']:
+            text += f"，出错 {progress['errors']} 个"
+        if self.job is not None and self.job.cancelled:
+            text += "（正在取消...）"
+        self.status_text.SetLabel(text)
 
-    async def run_processing(self):
+    def on_start(self, event):
         file_path = self.file_picker.GetPath()
         output_dir = self.output_dir_picker.GetPath()
 
-        if file_path and output_dir:
-            try:
-                await process_excel(file_path, output_dir, self.update_progress)
-                wx.CallAfter(self.on_processing_complete)
-            except Exception as e:
-                logging.error(f"Error occurred during processing: {str(e)}")
-                wx.CallAfter(self.on_processing_complete)
-        else:
+        if not (file_path and output_dir):
             wx.MessageBox("请选择 Excel 文件位置和 JSON 文件存放目录。", "错误", wx.OK | wx.ICON_ERROR)
-
-    def on_start(self, event):
-        asyncio.run(self.run_processing())
-
-    def on_processing_complete(self):
-        wx.MessageBox("处理完成！", "信息", wx.OK | wx.ICON_INFORMATION)
+            return
+
+        # 转换在后台执行，界面保持响应
+        self.all_sheets = self.all_sheets_checkbox.GetValue()
+        work = partial(excel_to_json, file_path=file_path, output_dir=output_dir, all_sheets=self.all_sheets)
+        self.job = BackgroundJob(
+            work,
+            on_progress=lambda progress: wx.CallAfter(self.update_progress, progress),
+            on_finish=lambda result: wx.CallAfter(self.on_processing_complete, result),
+        )
+        self.start_button.Disable()
+        self.cancel_button.Enable()
+        self.progress_bar.SetValue(0)
+        self.status_text.SetLabel("正在读取 Excel 文件...")
+        self.job.start()
+
+    def on_cancel(self, event):
+        if self.job is not None and self.job.running():
+            self.job.cancel()
+            self.cancel_button.Disable()
+            self.status_text.SetLabel(self.status_text.GetLabel() + "（正在取消...）")
+
+    def on_processing_complete(self, result):
+        self.job = None
+        self.start_button.Enable()
+        self.cancel_button.Disable()
+
+        # 开启计时（YIHEYUAN_TIMING=1）时把各阶段耗时汇总写入日志目录
+        timer.save(log_dir, 'excel2json_gui')
+
+        for path, error in result.get('write_errors', []):
+            logging.error(f"Error writing {path}: {error}")
+        for sheet, error in result.get('sheet_errors', []):
+            logging.error(f"Error processing sheet {sheet}: {error}")
+        if 'error' in result:
+            logging.error(f"Error processing Excel file: {result['error']}")
+            wx.MessageBox(f"处理出错：{result['error']}", "错误", wx.OK | wx.ICON_ERROR)
+            return
+
+        if result['cancelled']:
+            wx.MessageBox(f"已取消，已完整写出 {result['written']} 个 JSON 文件。", "信息", wx.OK | wx.ICON_INFORMATION)
+            return
+
+        message = f"处理完成！共写出 {result['written']} 个 JSON 文件，用时 {format_seconds(result['elapsed'])}。"
+        if result['errors']:
+            message += f"\n{result['errors']} 个出错，详见日志 {log_file}。"
+        wx.MessageBox(message, "信息", wx.OK | wx.ICON_INFORMATION)
         self.Close(True)
 
     def on_close(self, event):
+        # 关闭窗口时先取消正在执行的转换，等待后台停止后再退出
+        if self.job is not None and self.job.running():
+            self.job.on_progress = self.job.on_finish = None
+            self.job.cancel()
+            self.job.wait()
         self.Destroy()
 
 if __name__ == "__main__":
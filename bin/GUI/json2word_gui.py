@@ -3,16 +3,30 @@
 
 import wx
 import os
-import json
-from threading import Thread
-from docx import Document
-import traceback
+import sys
+from functools import partial
+
+# 使用 bin 目录中的公共模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from stage_timer import timer
+from gui_engine import BackgroundJob, json_to_word, format_seconds
+
+# 日志目录（开启计时 YIHEYUAN_TIMING=1 时，各阶段耗时汇总也保存在这里）
+log_dir = "/Users/bigyang/myapp/yiheyuan/log"
+# word 模板文件路径
+template_path = "/Users/bigyang/myapp/yiheyuan/word/temp.docx"
 
 class MyFrame(wx.Frame):
     def __init__(self, *args, **kw):
         super(MyFrame, self).__init__(*args, **kw)
+        # 正在执行的后台生成任务
+        self.job = None
+        self.progress_dialog = None
         self.InitUI()
 
+        # 绑定窗口关闭事件
+        self.Bind(wx.EVT_CLOSE, self.OnClose)
+
     def InitUI(self):
         panel = wx.Panel(self)
         vbox = wx.BoxSizer(wx.VERTICAL)
@@ -36,8 +50,7 @@ class MyFrame(wx.Frame):
             wx.MessageBox("请选择有效的JSON文件夹路径", "错误", wx.OK | wx.ICON_ERROR)
             return
 
-        json_files = [f for f in os.listdir(json_dir) if f.endswith('.json')]
-        total_files = len(json_files)
+        total_files = len([f for f in os.listdir(json_dir) if f.endswith('.json')])
         if total_files == 0:
             wx.MessageBox("所选文件夹中没有JSON文件", "错误", wx.OK | wx.ICON_ERROR)
             return
@@ -45,80 +58,71 @@ class MyFrame(wx.Frame):
         self.output_dir = "/Users/bigyang/myapp/yiheyuan/ok/"
         os.makedirs(self.output_dir, exist_ok=True)
 
-        # 创建并显示进度条对话框
+        # 创建并显示进度条对话框（可取消）
         self.progress_dialog = wx.ProgressDialog(
             "文件处理进度",
             "正在处理 JSON 文件...",
             maximum=total_files,
             parent=self,
-            style=wx.PD_AUTO_HIDE | wx.PD_ELAPSED_TIME
+            style=wx.PD_AUTO_HIDE | wx.PD_ELAPSED_TIME | wx.PD_CAN_ABORT
+        )
+
+        # 多进程后台生成：每个进程只加载一次模板，界面线程只负责显示进度
+        self.startBtn.Disable()
+        self.job = BackgroundJob(
+            partial(json_to_word, json_dir=json_dir, output_dir=self.output_dir, template_path=template_path),
+            on_progress=lambda progress: wx.CallAfter(self.UpdateProgress, progress),
+            on_finish=lambda result: wx.CallAfter(self.OnFinish, result),
         )
+        self.job.start()
 
-        # 创建并启动线程来处理文件
-        self.thread = Thread(target=self.ProcessFiles, args=(json_dir, json_files))
-        self.thread.start()
-
-    def ProcessFiles(self, json_dir, json_files):
-        try:
-            # 在后台线程中处理文件
-            for i, json_file in enumerate(json_files):
-                self.process_json(json_dir, json_file)
-                # 更新进度
-                wx.CallAfter(self.UpdateProgress, i + 1, len(json_files))
-
-            # 处理完成后，显示完成对话框
-            wx.CallAfter(self.OnFinish)
-        except Exception as e:
-            # 捕获所有异常并记录日志
-            error_msg = f"处理文件时出错: {str(e)}\n{traceback.format_exc()}"
-            print(error_msg)  # 可以替换为将错误写入日志文件
-            wx.CallAfter(wx.MessageBox, error_msg, "错误", wx.OK | wx.ICON_ERROR)
-
-    def process_json(self, json_dir, json_file):
-        try:
-            template_path = "/Users/bigyang/myapp/yiheyuan/word/temp.docx"
-            doc = Document(template_path)
-
-            json_path = os.path.join(json_dir, json_file)
-            with open(json_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-
-            placeholders = {
-                "年": "year", "月": "month", "日": "day", "总登记号": "zongdengjihao",
-                "分类号": "fenleihao", "名称": "mingcheng", "年代": "niandai", "件数": "jianshu",
-                "单位": "danwei", "尺寸": "chicun", "重量": "zhongliang", "质地": "zhidi",
-                "完残情况": "wancanqingkuang", "来源": "laiyuan", "入馆凭证号": "ruguanpingzhenghao",
-                "注销凭证号": "zhuxiaopingzhenghao", "级别": "jibie", "备注": "beizhu"
-            }
-
-            for p in doc.paragraphs:
-                for key, placeholder in placeholders.items():
-                    if placeholder in p.text:
-                        p.text = p.text.replace(placeholder, str(data.get(key, "")))
-
-            # 更新表格中的占位符
-            for table in doc.tables:
-                for row in table.rows:
-                    for cell in row.cells:
-                        for key, placeholder in placeholders.items():
-                            if placeholder in cell.text:
-                                cell.text = cell.text.replace(placeholder, str(data.get(key, "")))
-
-            output_file = os.path.join(self.output_dir, f"{os.path.splitext(json_file)[0]}.docx")
-            doc.save(output_file)
-        except Exception as e:
-            raise RuntimeError(f"处理文件 {json_file} 时出错: {str(e)}") from e
-
-    def UpdateProgress(self, current, total):
-        # 更新进度条
-        self.progress_dialog.Update(current, f"已处理 {current} / {total} 个文件")
-
-    def OnFinish(self):
+    def UpdateProgress(self, progress):
+        # 更新进度条（进度已按时间间隔合并，不会每个文件刷新一次）
+        if self.progress_dialog is None or self.job is None:
+            return
+        message = f"已处理 {progress['done']} / {progress['total']} 个文件，每秒 {progress['items_per_second']:.1f} 个"
+        if progress['eta'] is not None:
+            message += f"，预计剩余 {format_seconds(progress['eta'])}"
+        if progress['errors']:
+            message += f"，出错 {progress['errors']} 个"
+        keep_going, _ = self.progress_dialog.Update(min(progress['done'], progress['total']), message)
+        if not keep_going and not self.job.cancelled:
+            # 点击了进度条对话框中的取消按钮
+            self.job.cancel()
+            self.progress_dialog.Update(min(progress['done'], progress['total']), message + "（正在取消...）")
+
+    def OnFinish(self, result):
+        self.job = None
+        self.startBtn.Enable()
+        timer.save(log_dir, 'json2word_gui')
         # 关闭进度条对话框
         if self.progress_dialog:
             self.progress_dialog.Destroy()
+            self.progress_dialog = None
+
+        for json_file, error in result.get('failed', []):
+            print(f"处理文件 {json_file} 时出错: {error}")
+        if 'error' in result:
+            wx.MessageBox(f"处理文件时出错: {result['error']}", "错误", wx.OK | wx.ICON_ERROR)
+            return
 
-        wx.MessageBox(f"生成结束！共计生成 {len(os.listdir(self.output_dir))} 个文件！", "提示", wx.OK | wx.ICON_INFORMATION)
+        message = f"共计生成 {result['succeeded']} 个文件，用时 {format_seconds(result['elapsed'])}"
+        if result['failed']:
+            message += f"，{len(result['failed'])} 个文件出错"
+        if result['cancelled']:
+            wx.MessageBox(f"已取消！{message}。", "提示", wx.OK | wx.ICON_INFORMATION)
+        else:
+            wx.MessageBox(f"生成结束！{message}！", "提示", wx.OK | wx.ICON_INFORMATION)
+
+    def OnClose(self, event):
+        # 关闭窗口时先取消正在执行的生成任务，等待工作进程停止后再退出
+        if self.job is not None and self.job.running():
+            self.job.on_progress = self.job.on_finish = None
+            self.job.cancel()
+            self.job.wait()
+        if self.progress_dialog:
+            self.progress_dialog.Destroy()
+        self.Destroy()
 
 class MyApp(wx.App):
     def OnInit(self):
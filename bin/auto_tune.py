@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# 自动调优：根据可用的 CPU 核数和内存选择执行器类型（进程池/线程池）、进程数和每批行数，
+# 运行中再根据实测的处理速度和内存占用调整每个任务的行数和同时在途的任务数。
+# 各项设置都可以手动指定，指定的值固定不变，只有未指定的由调优器决定
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# 每种工作负载的参数：
+# process_min_cpus 至少有这么多核时才使用进程池（核数少时进程间传输数据的开销得不偿失）；
+# worker_mb 每个进程的大致内存占用；record_kb 每条在途记录的大致内存占用；
+# part_size 每个任务的初始行数，min_part/max_part 为调整范围；max_threads 使用线程池时的线程数上限
+WORKLOADS = {
+    # Excel 行转换为 JSON：单条很快，任务太小时调度开销占比高
+    'convert': {'process_min_cpus': 4, 'worker_mb': 80, 'record_kb': 4,
+                'part_size': 250, 'min_part': 25, 'max_part': 5000, 'max_threads': 4},
+    # 填充模板生成 Word：单条较慢，任务小一些负载更均衡
+    'render': {'process_min_cpus': 2, 'worker_mb': 150, 'record_kb': 16,
+               'part_size': 20, 'min_part': 1, 'max_part': 500, 'max_threads': 4},
+}
+
+# 每个任务的目标耗时（秒）：太短时调度和进程间传输的开销占比高，太长时各进程负载不均、进度更新慢
+TARGET_TASK_SECONDS = 0.5
+# 内存占用上限为启动时可用内存的比例，超过后缩小任务和在途窗口
+MEMORY_FRACTION = 0.5
+# 两次调整之间至少间隔的时间（秒）
+ADJUST_INTERVAL = 1.0
+
+
+# 函数：当前进程可用的 CPU 核数（考虑 CPU 亲和性限制）
+def available_cpus():
+    if hasattr(os, 'sched_getaffinity'):
+        return max(1, len(os.sched_getaffinity(0)))
+    return os.cpu_count() or 1
+
+
+# 函数：可用内存（MB），无法获取时返回 None
+def available_memory_mb():
+    if psutil is not None:
+        return psutil.virtual_memory().available / 1024 / 1024
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+# 函数：本进程及其子进程（进程池）的内存占用（MB），无法获取时返回 None
+def tree_rss_mb():
+    if psutil is not None:
+        try:
+            process = psutil.Process()
+            rss = process.memory_info().rss
+            for child in process.children(recursive=True):
+                try:
+                    rss += child.memory_info().rss
+                except psutil.Error:
+                    pass
+            return rss / 1024 / 1024
+        except psutil.Error:
+            return None
+    try:
+        # 没有 psutil 时只能读取本进程（Linux）
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class AutoTuner:
+    # workload 为 WORKLOADS 中的一种；executor / workers / chunk_size / max_in_flight 为手动设置，None 时自动选择；
+    # adaptive=False 时只在启动时选择一次，运行中不再调整
+    def __init__(self, workload, executor=None, workers=None, chunk_size=None, max_in_flight=None, adaptive=True):
+        profile = WORKLOADS[workload]
+        self.workload = workload
+        self.profile = profile
+        self.cpus = available_cpus()
+        memory = available_memory_mb()
+        self.memory_budget_mb = memory * MEMORY_FRACTION if memory else None
+
+        if executor is None:
+            executor = 'process' if self.cpus >= profile['process_min_cpus'] else 'thread'
+        self.executor = executor
+
+        if workers is None:
+            if executor == 'process':
+                workers = self.cpus
+                if self.memory_budget_mb:
+                    # 每个进程都有独立的内存，进程数受内存限制
+                    workers = min(workers, int(self.memory_budget_mb // profile['worker_mb']))
+            else:
+                workers = min(self.cpus, profile['max_threads'])
+        self.workers = max(1, workers)
+
+        self.fixed_window = max_in_flight is not None
+        self.max_window = max_in_flight or self.workers * 2
+        self.max_in_flight = self.max_window
+
+        # 手动指定每批行数时，每批按进程数切分为固定大小的任务（与原来的处理方式相同）
+        self.fixed_part = chunk_size is not None
+        if chunk_size is None:
+            self.part_size = profile['part_size']
+            # 每批至少能切出最大的任务，任务行数调大时不受每批行数限制
+            chunk_size = max(profile['max_part'], self.part_size * self.workers)
+            if self.memory_budget_mb:
+                # 一批数据和在途的任务都要放得下
+                max_rows = int(self.memory_budget_mb * 1024 / profile['record_kb'] / 2)
+                chunk_size = max(profile['min_part'], min(chunk_size, max_rows))
+        else:
+            self.part_size = -(-chunk_size // self.workers)  # 向上取整
+        self.chunk_size = chunk_size
+
+        self.adaptive = adaptive
+        # 调整记录 [{开始后的秒数、每秒条数、内存、任务行数、在途任务数}, ...]
+        self.history = []
+        self._started = self._since = time.perf_counter()
+        self._items = 0
+
+    # 函数：创建执行器（进程池或线程池），kwargs 传给执行器（如进程池的 initializer、initargs）
+    def make_executor(self, **kwargs):
+        if self.executor == 'process':
+            return ProcessPoolExecutor(max_workers=self.workers, **kwargs)
+        initializer = kwargs.pop('initializer', None)
+        initargs = kwargs.pop('initargs', ())
+        executor = ThreadPoolExecutor(max_workers=self.workers, **kwargs)
+        if initializer is not None:
+            # 线程共用一个进程，初始化一次即可
+            initializer(*initargs)
+        return executor
+
+    # 函数：当前的在途任务数上限，可直接作为 bounded_map / run_bounded 的 max_in_flight（每次补充任务时读取）
+    def window(self):
+        return self.max_in_flight
+
+    # 函数：把读取的每一批切分为当前大小的任务（DataFrame 或列表）
+    def split(self, chunks):
+        for chunk in chunks:
+            start = 0
+            while start < len(chunk):
+                end = start + self.part_size
+                yield chunk.iloc[start:end] if hasattr(chunk, 'iloc') else chunk[start:end]
+                start = end
+
+    # 函数：记录一个任务完成及其处理的条数，按间隔根据实测速度和内存调整
+    def record(self, items):
+        self._items += items
+        if not self.adaptive:
+            return
+        elapsed = time.perf_counter() - self._since
+        if elapsed >= ADJUST_INTERVAL and self._items:
+            self._adjust(self._items / elapsed)
+            self._since, self._items = time.perf_counter(), 0
+
+    # 函数：调整任务行数和在途任务数
+    def _adjust(self, items_per_second):
+        profile = self.profile
+        if not self.fixed_part:
+            # 所有进程都在工作时，一个任务的耗时约为 任务行数 × 进程数 ÷ 总速度；向目标耗时靠拢，每次最多变化一倍
+            task_seconds = self.part_size * min(self.workers, self.max_in_flight) / items_per_second
+            factor = min(2.0, max(0.5, TARGET_TASK_SECONDS / task_seconds))
+            self.part_size = min(profile['max_part'], max(profile['min_part'], int(self.part_size * factor)))
+
+        rss = tree_rss_mb()
+        if rss is not None and self.memory_budget_mb:
+            if rss > self.memory_budget_mb:
+                # 内存超出预算：任务减半，在途任务数减半（同时工作的进程也随之减少）
+                if not self.fixed_part:
+                    self.part_size = max(profile['min_part'], self.part_size // 2)
+                if not self.fixed_window:
+                    self.max_in_flight = max(1, self.max_in_flight // 2)
+            elif rss < self.memory_budget_mb / 2 and self.max_in_flight < self.max_window:
+                # 内存宽裕时逐步恢复
+                self.max_in_flight += 1
+
+        self.history.append({'seconds': round(time.perf_counter() - self._started, 3),
+                             'items_per_second': round(items_per_second, 1),
+                             'rss_mb': round(rss, 1) if rss is not None else None,
+                             'part_size': self.part_size, 'max_in_flight': self.max_in_flight})
+
+    # 函数：当前设置的说明文字，用于启动时打印
+    def describe(self):
+        kind = f'进程池 {self.workers} 个进程' if self.executor == 'process' else f'线程池 {self.workers} 个线程'
+        mode = '运行中自动调整' if self.adaptive else '固定'
+        if self.workload == 'render':
+            # 生成 Word 时任务按记录（文件）计数，每批读取的行数（如 json2word_multi 固定为 1）没有意义，不显示
+            return (f"{kind}（{self.cpus} 核），每个任务 {self.part_size} 条记录，"
+                    f"同时在途 {self.max_in_flight} 个任务，{mode}")
+        return (f"{kind}（{self.cpus} 核），每批读取 {self.chunk_size} 行，每个任务 {self.part_size} 行，"
+                f"同时在途 {self.max_in_flight} 个任务，{mode}")
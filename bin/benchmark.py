@@ -0,0 +1,361 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# 性能基准测试：生成与真实数据列相同的合成 Excel（.xls / .xlsx，1k ~ 1M 行），
+# 分别运行 excel2json.py / excel2json_multi.py 和 json2word.py / json2word_multi.py，
+# 记录每个阶段的耗时、每秒处理行数和内存峰值，结果保存为 JSON 以便不同版本之间对比
+#
+# 用法示例：
+#   python benchmark.py                                   # 默认 1k/10k/100k/1M 行
+#   python benchmark.py --sizes 1000,10000 --formats xlsx
+#   python benchmark.py --sizes 1000 --compare bench_old.json
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import subprocess
+import tempfile
+from datetime import datetime
+from multiprocessing import cpu_count
+from template_engine import PLACEHOLDER_FIELDS
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+bin_dir = os.path.dirname(os.path.abspath(__file__))
+project_dir = os.path.dirname(bin_dir)
+
+# 默认测试规模（行数）
+default_sizes = [1000, 10000, 100000, 1000000]
+# .xls 格式单个工作表最多 65536 行（含表头）
+XLS_MAX_ROWS = 65535
+# 生成 Word 的阶段较慢，超过该行数的规模只测试 Excel 转 JSON 阶段
+default_word_max_rows = 10000
+
+# 参与对比的脚本，按阶段分组
+STAGES = {
+    'excel2json': ['excel2json.py', 'excel2json_multi.py'],
+    'json2word': ['json2word.py', 'json2word_multi.py'],
+}
+
+# 真实数据的列顺序（与 excel/source.xlsx 一致）
+COLUMNS = list(PLACEHOLDER_FIELDS.values())
+
+_TEXT = '颐和园藏品瓷碗玉器青铜书画木雕漆器织绣钟表珐琅金银铜铁石刻砚台印章鼻烟壶如意屏风花瓶香炉'
+_MATERIALS = ['玉', '瓷', '铜', '木', '纸', '丝', '金', '银', '石', '漆']
+_DYNASTIES = ['明', '清', '康熙', '乾隆', '光绪', '民国']
+
+
+# 函数：随机生成一段中文文本
+def random_text(rng, low, high):
+    return ''.join(rng.choice(_TEXT) for _ in range(rng.randint(low, high)))
+
+
+# 函数：生成第 i 行合成数据（固定随机种子，每次生成的数据相同）
+def make_row(rng, i):
+    year, month, day = rng.randint(1950, 2024), rng.randint(1, 12), rng.randint(1, 28)
+    number = f'a{i:07d}'
+    category = f'b{rng.randint(0, 99999):05d}'
+    return [
+        year, f'{month:02d}', f'{day:02d}', number, category,
+        f'{random_text(rng, 2, 6)}-{i:07d}', rng.choice(_DYNASTIES), rng.randint(1, 5), '个',
+        f'口径{rng.randint(5, 60)}厘米，高{rng.randint(5, 90)}厘米', rng.randint(1, 50),
+        rng.choice(_MATERIALS), rng.choice(['全美', '微残', '残']), rng.choice(['旧藏', '拨交', '捐赠']),
+        f'颐{year}{month:02d}{day:02d}{number}{category}', '' if rng.random() < 0.8 else f'销{number}',
+        rng.choice(['一级', '二级', '三级', '一般']), '无', rng.choice(['黄蓉', '郭靖', '杨过']),
+        f'YHY2024TEST-{i:07d}', random_text(rng, 20, 120), random_text(rng, 4, 20),
+        random_text(rng, 0, 30),
+    ]
+
+
+# 函数：生成 .xlsx 文件（只写模式，内存占用与行数无关）
+def write_xlsx(path, rows):
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Sheet1')
+    sheet.append(COLUMNS)
+    rng = random.Random(rows)
+    for i in range(1, rows + 1):
+        sheet.append(make_row(rng, i))
+    workbook.save(path)
+
+
+# 函数：生成 .xls 文件（需要 xlwt）
+def write_xls(path, rows):
+    import xlwt
+    workbook = xlwt.Workbook(encoding='utf-8')
+    sheet = workbook.add_sheet('Sheet1')
+    for col, name in enumerate(COLUMNS):
+        sheet.write(0, col, name)
+    rng = random.Random(rows)
+    for i in range(1, rows + 1):
+        for col, value in enumerate(make_row(rng, i)):
+            sheet.write(i, col, value)
+    workbook.save(path)
+
+
+# 函数：生成（或复用已生成的）合成 Excel 文件，返回 (路径, 耗时)；无法生成时返回 (None, 原因)
+def prepare_workbook(data_dir, rows, fmt):
+    path = os.path.join(data_dir, f'synthetic_{rows}.{fmt}')
+    if os.path.exists(path):
+        return path, 0.0
+    if fmt == 'xls':
+        if rows > XLS_MAX_ROWS:
+            return None, f'.xls 最多支持 {XLS_MAX_ROWS} 行'
+        try:
+            import xlwt  # noqa: F401
+        except ImportError:
+            return None, '未安装 xlwt，无法生成 .xls 文件'
+    start = time.perf_counter()
+    tmp_path = path + '.tmp'
+    (write_xls if fmt == 'xls' else write_xlsx)(tmp_path, rows)
+    os.replace(tmp_path, path)
+    return path, time.perf_counter() - start
+
+
+# 函数：清空并重建目录
+def reset_dir(path):
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+
+
+# 函数：统计目录中指定后缀的文件数
+def count_files(path, suffix):
+    if not os.path.isdir(path):
+        return 0
+    return sum(1 for name in os.listdir(path) if name.endswith(suffix))
+
+
+# 函数：进程树（主进程及其所有子进程）当前占用的内存总量
+def tree_rss(proc):
+    try:
+        processes = [proc] + proc.children(recursive=True)
+    except psutil.Error:
+        return 0
+    total = 0
+    for p in processes:
+        try:
+            total += p.memory_info().rss
+        except psutil.Error:
+            pass
+    return total
+
+
+# 函数：运行一个脚本并测量耗时和内存峰值
+# peak_rss_mb 为脚本主进程的内存峰值；peak_tree_rss_mb 为包含进程池子进程在内的内存总量峰值（需要 psutil）
+def run_script(script, workdir, excel_path, stdin_text, log_path, timing=False):
+    env = dict(os.environ, YIHEYUAN_HOME=workdir, YIHEYUAN_EXCEL=excel_path or '', PYTHONIOENCODING='utf-8',
+               YIHEYUAN_TIMING='1' if timing else '')
+    with open(log_path, 'wb') as log:
+        start = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, os.path.join(bin_dir, script)], cwd=bin_dir, env=env,
+                                stdin=subprocess.PIPE, stdout=log, stderr=subprocess.STDOUT)
+        if stdin_text:
+            proc.stdin.write(stdin_text.encode('utf-8'))
+        proc.stdin.close()
+
+        watched = psutil.Process(proc.pid) if psutil else None
+        peak_tree = 0
+        while True:
+            # 用 wait4 回收子进程，同时取得其资源使用情况
+            pid, status, usage = os.wait4(proc.pid, os.WNOHANG)
+            if pid:
+                break
+            if watched is not None:
+                peak_tree = max(peak_tree, tree_rss(watched))
+            time.sleep(0.05)
+        elapsed = time.perf_counter() - start
+        proc.returncode = os.waitstatus_to_exitcode(status)
+
+    # Linux 上 ru_maxrss 单位为 KB，macOS 上为字节
+    maxrss = usage.ru_maxrss if sys.platform == 'darwin' else usage.ru_maxrss * 1024
+    return {
+        'seconds': round(elapsed, 3),
+        'returncode': proc.returncode,
+        'peak_rss_mb': round(maxrss / 1024 / 1024, 1),
+        'peak_tree_rss_mb': round(peak_tree / 1024 / 1024, 1) if watched is not None else None,
+        'cpu_seconds': round(usage.ru_utime + usage.ru_stime, 3),
+    }
+
+
+# 函数：读取并删除脚本写入日志目录的各阶段耗时汇总（stage_timer.py），没有时返回 None
+def load_timing(log_dir):
+    names = [name for name in os.listdir(log_dir) if name.startswith('timing_') and name.endswith('.json')]
+    if not names:
+        return None
+    stages = None
+    for name in names:
+        path = os.path.join(log_dir, name)
+        with open(path, 'r', encoding='utf-8') as f:
+            stages = json.load(f)['stages']
+        os.remove(path)
+    return stages
+
+
+# 函数：准备工作目录（每个脚本使用同一份 Word 模板）
+def prepare_workdir(workdir):
+    os.makedirs(os.path.join(workdir, 'word'), exist_ok=True)
+    shutil.copy(os.path.join(project_dir, 'word', 'temp.docx'), os.path.join(workdir, 'word', 'temp.docx'))
+    for name in ('json', 'ok', 'log'):
+        os.makedirs(os.path.join(workdir, name), exist_ok=True)
+
+
+# 函数：测试一种规模和格式：先运行各个 excel2json 脚本，再基于生成的 JSON 运行各个 json2word 脚本
+def bench_case(workdir, excel_path, rows, fmt, stages, word_max_rows, repeat, timing=False):
+    results = []
+    json_dir = os.path.join(workdir, 'json')
+    ok_dir = os.path.join(workdir, 'ok')
+    log_dir = os.path.join(workdir, 'log')
+
+    for stage in stages:
+        scripts = STAGES[stage]
+        if stage == 'json2word' and rows > word_max_rows:
+            for script in scripts:
+                results.append({'stage': stage, 'script': script, 'rows': rows, 'format': fmt,
+                                'skipped': f'超过 --word-max-rows（{word_max_rows}）'})
+            continue
+
+        for script in scripts:
+            runs = []
+            for _ in range(repeat):
+                if stage == 'excel2json':
+                    reset_dir(json_dir)
+                    stdin_text, outputs, suffix = None, json_dir, '.json'
+                else:
+                    reset_dir(ok_dir)
+                    stdin_text, outputs, suffix = json_dir + '\n', ok_dir, '.docx'
+                # 清空工作表缓存（workbook_cache.py），每个脚本都从解析 Excel 开始计时
+                reset_dir(os.path.join(workdir, 'cache'))
+                log_path = os.path.join(log_dir, f'{stage}_{os.path.splitext(script)[0]}_{fmt}_{rows}.out')
+                run = run_script(script, workdir, excel_path, stdin_text, log_path, timing)
+                if timing:
+                    run['stages'] = load_timing(log_dir)
+                run['outputs'] = count_files(outputs, suffix)
+                if run['returncode'] != 0:
+                    # 工作目录可能在结束后被删除，出错时保留输出的最后几行
+                    with open(log_path, 'r', encoding='utf-8', errors='replace') as f:
+                        run['error'] = ''.join(f.readlines()[-5:])
+                runs.append(run)
+                print(f'  {script:<22} {rows:>8} 行 {fmt:<4}  {run["seconds"]:>9.2f} 秒  '
+                      f'{rows / run["seconds"] if run["seconds"] else 0:>10.1f} 行/秒  '
+                      f'内存峰值 {run["peak_rss_mb"]} MB  输出 {run["outputs"]} 个'
+                      + ('' if run['returncode'] == 0 else f'  [退出码 {run["returncode"]}]\n{run["error"]}'))
+
+            # 多次运行时取耗时最短的一次
+            best = min(runs, key=lambda r: r['seconds'])
+            result = {'stage': stage, 'script': script, 'rows': rows, 'format': fmt}
+            result.update(best)
+            result['rows_per_second'] = round(rows / best['seconds'], 1) if best['seconds'] else None
+            result['all_seconds'] = [r['seconds'] for r in runs]
+            results.append(result)
+
+    # 两个版本的 json2word 都使用 excel2json 阶段最后一次的输出，全部结束后再清理
+    reset_dir(json_dir)
+    reset_dir(ok_dir)
+    return results
+
+
+# 函数：运行环境信息，便于对比不同机器、不同版本的结果
+def environment_info():
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=project_dir,
+                                  capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        revision = None
+    return {
+        'time': datetime.now().isoformat(timespec='seconds'),
+        'git_revision': revision,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': cpu_count(),
+        'memory_mb': round(psutil.virtual_memory().total / 1024 / 1024) if psutil else None,
+    }
+
+
+# 函数：与之前保存的结果对比，打印耗时变化
+def compare(results, previous_path):
+    with open(previous_path, 'r', encoding='utf-8') as f:
+        previous = json.load(f)
+    old = {(r['script'], r['format'], r['rows']): r for r in previous['results'] if 'seconds' in r}
+    print(f'\n与 {previous_path}（版本 {previous["environment"].get("git_revision")}）对比：')
+    for r in results:
+        before = old.get((r['script'], r['format'], r['rows']))
+        if 'seconds' not in r or before is None:
+            continue
+        speedup = before['seconds'] / r['seconds'] if r['seconds'] else float('inf')
+        print(f'  {r["script"]:<22} {r["rows"]:>8} 行 {r["format"]:<4}  '
+              f'{before["seconds"]:>9.2f} 秒 -> {r["seconds"]:>9.2f} 秒  ({speedup:.2f}x)  '
+              f'内存峰值 {before["peak_rss_mb"]} -> {r["peak_rss_mb"]} MB')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Excel 转 JSON、JSON 转 Word 各脚本的性能基准测试')
+    parser.add_argument('--sizes', default=','.join(str(n) for n in default_sizes),
+                        help='测试的行数，逗号分隔（默认 1000,10000,100000,1000000）')
+    parser.add_argument('--formats', default='xlsx,xls', help='测试的 Excel 格式，逗号分隔（默认 xlsx,xls）')
+    parser.add_argument('--stages', default=','.join(STAGES), help='测试的阶段，逗号分隔（默认 excel2json,json2word）')
+    parser.add_argument('--word-max-rows', type=int, default=default_word_max_rows,
+                        help=f'只对不超过该行数的规模测试 json2word 阶段（默认 {default_word_max_rows}）')
+    parser.add_argument('--timing', action='store_true',
+                        help='开启各脚本的分阶段计时（YIHEYUAN_TIMING=1），把各阶段耗时一并写入结果')
+    parser.add_argument('--repeat', type=int, default=1, help='每个脚本重复运行的次数，取最快一次（默认 1）')
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'yiheyuan_bench_data'),
+                        help='合成 Excel 文件的缓存目录，已生成的文件会直接复用')
+    parser.add_argument('--workdir', default=None, help='运行脚本的工作目录（默认使用临时目录，结束后删除）')
+    parser.add_argument('--output', default=None, help='结果 JSON 文件路径（默认 log/benchmark_时间.json）')
+    parser.add_argument('--compare', default=None, help='与之前保存的结果 JSON 对比')
+    args = parser.parse_args()
+
+    sizes = [int(n) for n in args.sizes.split(',') if n]
+    formats = [f.strip().lstrip('.') for f in args.formats.split(',') if f.strip()]
+    stages = [s.strip() for s in args.stages.split(',') if s.strip()]
+    for stage in stages:
+        if stage not in STAGES:
+            parser.error(f'未知的阶段：{stage}')
+    # json2word 阶段依赖 excel2json 阶段生成的 JSON
+    if 'json2word' in stages and 'excel2json' not in stages:
+        stages.insert(0, 'excel2json')
+    stages.sort(key=list(STAGES).index)
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    workdir = args.workdir or tempfile.mkdtemp(prefix='yiheyuan_bench_')
+    prepare_workdir(workdir)
+
+    results = []
+    try:
+        for rows in sizes:
+            for fmt in formats:
+                excel_path, info = prepare_workbook(args.data_dir, rows, fmt)
+                if excel_path is None:
+                    print(f'跳过 {rows} 行 .{fmt}：{info}')
+                    results.append({'stage': 'generate', 'rows': rows, 'format': fmt, 'skipped': info})
+                    continue
+                print(f'{rows} 行 .{fmt}（{excel_path}，生成耗时 {info:.2f} 秒）')
+                results.append({'stage': 'generate', 'rows': rows, 'format': fmt, 'seconds': round(info, 3),
+                                'file_size_mb': round(os.path.getsize(excel_path) / 1024 / 1024, 2)})
+                results.extend(bench_case(workdir, excel_path, rows, fmt, stages, args.word_max_rows, args.repeat,
+                                          args.timing))
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    output = args.output or os.path.join(project_dir, 'log',
+                                         f'benchmark_{datetime.now().strftime("%Y-%m-%d_%H-%M-%S")}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({'environment': environment_info(), 'results': results}, f, ensure_ascii=False, indent=4)
+    print(f'\n结果已保存到 {output}')
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
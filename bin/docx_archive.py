@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# 归档输出：生成的 Word 文件按完成顺序直接写入 ZIP 归档（可按大小分卷），代替逐个创建文件再打包
+
+import os
+import time
+import zipfile
+
+
+class ArchiveWriter:
+    def __init__(self, archive_path, max_bytes=None):
+        # max_bytes 为每个归档文件的大小上限，超过后自动写入下一个分卷（xxx_002.zip ...）；None 表示不分卷
+        self.archive_path = archive_path
+        self.max_bytes = max_bytes
+        self.volume = 0
+        self.paths = []
+        self.count = 0
+        self._zip = None
+        os.makedirs(os.path.dirname(os.path.abspath(archive_path)), exist_ok=True)
+
+    # 函数：第 n 个分卷的文件名，第一个分卷使用原文件名
+    def _volume_path(self, volume):
+        if volume == 1:
+            return self.archive_path
+        base, ext = os.path.splitext(self.archive_path)
+        return f"{base}_{volume:03d}{ext}"
+
+    def _open_next(self):
+        if self._zip is not None:
+            self._zip.close()
+        self.volume += 1
+        path = self._volume_path(self.volume)
+        self._zip = zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED)
+        self.paths.append(path)
+
+    # 函数：写入一个文件；.docx 本身已经压缩，归档中直接存储不再压缩
+    def add(self, name, data):
+        if self._zip is None:
+            self._open_next()
+        elif self.max_bytes and self._zip.fp.tell() + len(data) > self.max_bytes:
+            self._open_next()
+        info = zipfile.ZipInfo(name, time.localtime()[:6])
+        info.compress_type = zipfile.ZIP_STORED
+        info.external_attr = 0o644 << 16
+        self._zip.writestr(info, data)
+        self.count += 1
+
+    def close(self):
+        if self._zip is not None:
+            self._zip.close()
+            self._zip = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -3,54 +3,118 @@
 
 import pandas as pd
 import os
-import json
-import re
-import aiofiles
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
+from excel_reader import KEY_COLUMN, chunk_to_records
+from workbook_cache import open_chunk_reader
+from record_store import RecordStoreWriter
+from manifest import Manifest, MANIFEST_NAME
+from scheduler import run_bounded
+from file_writer import BatchFileWriter, submit_json
+from template_engine import template_columns
+from stage_timer import timer, call_with_timing
+from sheet_converter import convert_workbook
+from auto_tune import AutoTuner
+from shard import Shard, write_shard_file
+
+# 项目根目录，可通过环境变量 YIHEYUAN_HOME 指定（如基准测试、多台机器分片运行）
+base_dir = os.environ.get('YIHEYUAN_HOME', '/Users/bigyang/myapp/yiheyuan')
 
 # 加载Excel文件
-file_path = '/Users/bigyang/myapp/yiheyuan/excel/source.xlsx'  # 替换为实际的Excel文件路径
+file_path = os.environ.get('YIHEYUAN_EXCEL', os.path.join(base_dir, 'excel', 'source.xlsx'))  # 替换为实际的Excel文件路径
+
+# 是否流式读取 Excel（逐行读取并分批处理，内存占用与文件大小无关）；False 时一次性读取整个工作表。
+# 两种方式输出的值相同：单元格中的文本原样保留（如“月”列的 '08' 不会变成 8），与 excel2json_multi.py 一致
+streaming = True
+
+# 列投影：只读取 Word 模板中实际用到的列（以及作为文件名的“总登记号”），其余列不转换、不写入 JSON，
+# 适合列很多的工作表；False 读取所有列
+project_columns = False
+template_path = os.path.join(base_dir, 'word', 'temp.docx')
+
+# 工作表缓存目录（仅流式读取）：再次读取同一个工作簿时直接加载缓存，不再解析 Excel；工作簿修改后缓存自动失效。None 不使用缓存
+workbook_cache_dir = os.path.join(base_dir, 'cache')
+# 缓存目录总大小上限（字节），超过时删除最久未使用的缓存
+workbook_cache_max_bytes = 1024 * 1024 * 1024
+
+# 自动调优（见 auto_tune.py）：根据 CPU 核数和可用内存选择线程池或进程池、线程/进程数和每批行数，
+# 运行中根据实测的处理速度和内存占用调整每个任务的行数和同时在途的任务数；False 时只在启动时选择一次
+auto_tune = True
+# 手动设置：None 由自动调优决定，设置后固定使用该值
+executor_type = None  # 'thread' 线程池；'process' 进程池
+max_workers = None  # 线程数或进程数
+batch_size = None  # 每批读取的行数，可根据系统内存进行调整
+max_in_flight = None  # 同时在途的任务数上限，内存占用只与此窗口有关
+
+# 排队等待写入的文件数上限
+max_pending_writes = 100
+# 写入 JSON 文件的线程数，以及每次交给写入线程的文件数
+writer_threads = 4
+write_batch_size = 25
 
 # 创建保存JSON文件的目录（如果不存在则创建）
-output_dir = '/Users/bigyang/myapp/yiheyuan/json/'
+output_dir = os.path.join(base_dir, 'json')
 try:
     os.makedirs(output_dir, exist_ok=True)
 except Exception as e:
     print(f"错误：无法创建目录 '{output_dir}'。请检查权限或路径是否正确。")
     raise e
 
-# 函数：清理文件名中的非法字符和不可见字符
-def clean_filename(filename):
-    # 移除不可见字符（如零宽度空格、控制字符等）
-    filename = re.sub(r'[\u200B-\u200D\uFEFF]', '', filename)  # 移除零宽度字符
-    filename = re.sub(r'[^\w\s-]', '', filename)  # 移除非字母、数字、下划线、连字符和空格的字符
-    filename = filename.strip()  # 去除首尾空格
-    return filename
-
-# 异步函数：将字典写入JSON文件
-async def write_json(file_name, row_dict):
-    json_file_path = os.path.join(output_dir, f'{file_name}.json')
-    try:
-        async with aiofiles.open(json_file_path, 'w', encoding='utf-8') as json_file:
-            await json_file.write(json.dumps(row_dict, ensure_ascii=False, indent=4))
-    except Exception as e:
-        print(f"错误：无法写入 JSON 文件 '{json_file_path}'。请检查文件路径或权限。")
-        raise e
+# 分片运行（见 shard.py）：多台机器各处理一部分行，按“总登记号”的哈希确定性地分配，结束后在输出目录写入分片清单，
+# 用 shard.py 校验所有分片合起来恰好覆盖 Excel 中的每一行一次。通过环境变量 YIHEYUAN_SHARD=序号/总数（如 0/4）指定，
+# 也可以直接设置为 Shard(0, 4)；未指定时不分片，处理全部数据
+shard = Shard.from_env()
+
+# 输出方式：'files' 每行写一个 JSON 文件；'jsonl' 所有记录追加写入一个记录库文件（附带按“总登记号”的索引）
+output_mode = 'files'
+record_store_path = os.path.join(output_dir, shard.file_name('records.jsonl'))
+
+# JSON 文件格式：False 缩进排版，便于阅读；True 紧凑格式（不缩进），文件约小一半、写入更快。
+# 安装了 orjson 时自动使用 orjson 序列化（见 json_codec.py）
+json_compact = False
+
+# 工作表：None 只转换第一个工作表；'all' 转换所有工作表；也可以是工作表名称列表，如 ['一号库房', '二号库房']。
+# 转换多个工作表时，每个工作表由一个进程独立处理，多个工作表同时转换
+sheets = None
+# 多个工作表的输出方式：'subdir' 每个工作表保存到输出目录下以工作表名称命名的子目录；
+# 'tag' 所有工作表保存到同一个目录，每条记录增加“工作表”字段，文件名为 工作表名_总登记号（避免不同工作表的文件互相覆盖）
+sheet_output = 'subdir'
+# 同时转换的工作表数，None 为可用的 CPU 核数
+sheet_workers = None
+
+# 增量模式（仅 'files' 输出）：根据清单跳过内容未变化的行，并删除 Excel 中已不存在的行对应的 JSON 文件
+incremental = True
 
-# 多线程处理函数
-def process_row(index, row):
+# 多线程/多进程处理函数：整批转换数据，每批只需一次线程切换或进程间传输；分片运行时只返回本分片的行
+def process_chunk(chunk):
     try:
-        # 将所有列的值转换为字符串类型
-        row_dict = {col: str(row[col]) for col in row.index}
-        file_name = row_dict.get('总登记号', f'row_{index+1}')  # 如果“总登记号”为空，使用行号作为文件名
-        file_name = clean_filename(file_name)
-        return file_name, row_dict
+        with timer.stage('convert', len(chunk)):
+            return shard.select(chunk_to_records(chunk))
     except Exception as e:
-        print(f"错误：处理第 {index+1} 行时出错。")
+        print(f"错误：处理第 {chunk.index[0]+1} 至 {chunk.index[-1]+1} 行时出错。")
         raise e
 
+
+# 函数：多工作表模式：每个工作表一个进程，同时转换所有选中的工作表
+def convert_sheets():
+    columns = template_columns(template_path) if project_columns else None
+    # 每个工作表一个进程，进程数和每批行数由自动调优决定（手动设置优先）
+    tuner = AutoTuner('convert', 'process', sheet_workers, batch_size, adaptive=False)
+    options = dict(sheet_output=sheet_output, output_mode=output_mode, compact=json_compact, incremental=incremental,
+                   batch_size=tuner.chunk_size, columns=columns, cache_dir=workbook_cache_dir,
+                   cache_max_bytes=workbook_cache_max_bytes)
+    for result in convert_workbook(file_path, sheets, output_dir, tuner.workers, **options):
+        if 'error' in result:
+            print(f"错误：转换工作表 '{result['sheet']}' 时出错：{result['error']}")
+        else:
+            print(f"工作表 '{result['sheet']}'：共 {result['rows']} 行，写出 {result['written']} 个文件，"
+                  f"删除 {result['removed']} 个过期文件，保存在 '{result['output']}'。")
+    # 开启计时（YIHEYUAN_TIMING=1）时输出各阶段耗时汇总
+    timing_file = timer.save(os.path.join(base_dir, 'log'), 'excel2json')
+    if timing_file:
+        print(timer.report())
+        print(f"各阶段耗时汇总已保存到 '{timing_file}'。")
+
 # 主函数：处理Excel数据
 async def main():
     # 检查文件扩展名，确保支持 .xls 和 .xlsx 文件
@@ -60,14 +124,41 @@ async def main():
         print(f"错误：不支持的文件格式 '{file_ext}'。请使用 .xls 或 .xlsx 文件。")
         return
 
+    if sheets is not None:
+        if shard.enabled:
+            print("错误：多工作表模式不支持分片运行，请只转换一个工作表或取消分片设置。")
+            return
+        convert_sheets()
+        return
+
+    tuner = AutoTuner('convert', executor_type, max_workers, batch_size, max_in_flight, auto_tune)
+    print(f"自动调优：{tuner.describe()}")
+    if shard.enabled:
+        print(f"分片运行：{shard}")
+
     try:
-        # 根据文件扩展名选择读取方式
-        if file_ext == '.xls':
-            # 读取 .xls 文件
-            data = pd.read_excel(file_path, engine='xlrd')
-        elif file_ext == '.xlsx':
-            # 读取 .xlsx 文件
-            data = pd.read_excel(file_path, engine='openpyxl')
+        columns = template_columns(template_path) if project_columns else None
+        if streaming:
+            # 流式读取：边读边处理，第一批 JSON 文件在整个文件解析完之前就会写出
+            with timer.stage('excel_open'):
+                reader = open_chunk_reader(file_path, tuner.chunk_size, columns, workbook_cache_dir, workbook_cache_max_bytes)
+            total_records = reader.total_rows
+            # 逐批读取的耗时即 Excel 解析耗时
+            chunks = timer.iterate('excel_parse', reader, count=len)
+        else:
+            # 根据文件扩展名选择读取方式；按字符串读取，文本不做数值推断，与流式读取的结果相同
+            usecols = None if columns is None else (lambda name: name in columns or name == KEY_COLUMN)
+            with timer.stage('excel_parse'):
+                if file_ext == '.xls':
+                    # 读取 .xls 文件
+                    data = pd.read_excel(file_path, engine='xlrd', usecols=usecols, dtype=str)
+                elif file_ext == '.xlsx':
+                    # 读取 .xlsx 文件
+                    data = pd.read_excel(file_path, engine='openpyxl', usecols=usecols, dtype=str)
+            reader = None
+            # 计算总行数
+            total_records = len(data)
+            chunks = (data.iloc[i:i + tuner.chunk_size] for i in range(0, total_records, tuner.chunk_size))  # 手动分批
     except FileNotFoundError:
         print(f"错误：未找到 Excel 文件 '{file_path}'。请检查文件路径是否正确。")
         return
@@ -75,36 +166,104 @@ async def main():
         print(f"错误：读取 Excel 文件 '{file_path}' 时出错。")
         raise e
 
-    try:
-        # 计算总行数
-        total_records = len(data)
-
-        # 设置批次大小
-        batch_size = 50  # 可根据系统内存进行调整
+    store = RecordStoreWriter(record_store_path) if output_mode == 'jsonl' else None
+    # 分片运行时每个分片使用各自的清单，只管理本分片的行
+    manifest = Manifest(output_dir, name=shard.file_name(MANIFEST_NAME)) if incremental and output_mode == 'files' else None
+    complete = True  # 所有批次都处理成功
+    # 分片运行时记录本分片的所有行和转换失败的批次，结束后写入分片清单
+    shard_keys, failed_rows = [], []
+    # 写入线程：序列化后的 JSON 按批写入文件，排队的文件数有上限
+    writer = BatchFileWriter(writer_threads, max_pending_writes, write_batch_size) if store is None else None
 
-        with ThreadPoolExecutor(max_workers=4) as executor:  # 根据CPU核心数量调整线程数
+    try:
+        with tuner.make_executor() as executor:
             loop = asyncio.get_event_loop()
             with tqdm(total=total_records) as pbar:  # 初始化进度条
-                for i in range(0, total_records, batch_size):
-                    chunk = data.iloc[i:i + batch_size]  # 手动分批
-                    tasks = []
-                    for index, row in chunk.iterrows():
-                        try:
-                            file_name, row_dict = await loop.run_in_executor(executor, process_row, index, row)
-                            tasks.append(write_json(file_name, row_dict))
-                            pbar.update(1)  # 每处理一行，更新进度条
-                        except Exception as e:
-                            print(f"错误：处理第 {index+1} 行时出错。")
-                            continue  # 继续处理其他行
-                    await asyncio.gather(*tasks)
+                # 函数：转换一批数据并写出
+                async def handle_chunk(chunk):
+                    nonlocal complete
+                    try:
+                        if timer.enabled and tuner.executor == 'process':
+                            # 子进程中的转换耗时随结果一起返回
+                            records, stats = await loop.run_in_executor(executor, call_with_timing, process_chunk, chunk)
+                            timer.merge(stats)
+                        else:
+                            records = await loop.run_in_executor(executor, process_chunk, chunk)
+                    except Exception as e:
+                        complete = False
+                        timer.count('failed_rows', len(chunk))
+                        rows = f'第 {chunk.index[0] + 1} 至 {chunk.index[-1] + 1} 行'
+                        # 线程池中工作线程自己输出的错误可能看不到，在主线程中再输出一次出错原因
+                        failed_rows.append(f'{rows}：{e}')
+                        print(f"错误：处理{rows}时出错：{e}")
+                        return  # 继续处理其他批次
+                    finally:
+                        tuner.record(len(chunk))
+                    if store is not None:
+                        with timer.stage('store_write', len(records)):
+                            store.write_many(records)
+                    else:
+                        if manifest is not None:
+                            # 只写出内容有变化的行
+                            with timer.stage('manifest', len(records)):
+                                changed = manifest.filter_changed(records, lambda key: os.path.join(output_dir, f'{key}.json'))
+                        else:
+                            changed = records
+                        submit_json(writer, changed, output_dir, json_compact)
+                        timer.count('written', len(changed))
+                    timer.count('rows', len(records))
+                    if shard.enabled:
+                        shard_keys.extend(key for key, _ in records)
+                    pbar.update(len(chunk))  # 每处理一批，更新进度条
+
+                # 读取、转换和写入流水线执行，每批按调优器当前的任务大小切分，完成一个任务再提交下一个
+                await run_bounded(handle_chunk, tuner.split(chunks), tuner.window)
+
+        if writer is not None:
+            # 等待所有文件写完；写入失败的行从清单中移除，下次重新写出
+            writer.close()
+            for path, error in writer.errors:
+                print(f"错误：无法写入 JSON 文件 '{path}'：{error}")
+            if writer.errors:
+                complete = False
+                if manifest is not None:
+                    for key in writer.failed_keys():
+                        manifest.discard(key)
+
+        if manifest is not None:
+            if complete:
+                # 删除 Excel 中已不存在的行对应的 JSON 文件（有批次出错时不删除，避免误删）
+                removed = manifest.remove_stale()
+                if removed:
+                    print(f"已删除 {len(removed)} 个过期的 JSON 文件。")
+            manifest.save()
+
+        if shard.enabled:
+            # 转换失败的批次和写入失败的行记为失败，校验时报告
+            failed = failed_rows + (writer.failed_keys() if writer is not None else [])
+            shard_file = write_shard_file(output_dir, shard, 'excel2json', shard_keys, failed,
+                                          '.json' if output_mode == 'files' else None)
+            print(f"本分片共 {len(shard_keys)} 行，分片清单已保存到 '{shard_file}'。")
     except Exception as e:
         print(f"错误：处理数据时发生错误。")
         raise e
+    finally:
+        if reader is not None:
+            reader.close()
+        if store is not None:
+            store.close()
+        if writer is not None:
+            writer.close()
+        # 开启计时（YIHEYUAN_TIMING=1）时输出各阶段耗时汇总
+        timing_file = timer.save(os.path.join(base_dir, 'log'), 'excel2json')
+        if timing_file:
+            print(timer.report())
+            print(f"各阶段耗时汇总已保存到 '{timing_file}'。")
 
 if __name__ == "__main__":
     try:
         asyncio.run(main())
-        print(f"数据已成功导出到 '{output_dir}' 目录。")
+        print(f"数据已成功导出到 '{record_store_path if output_mode == 'jsonl' else output_dir}'。")
     except Exception as e:
         print("程序运行时出现错误。请查看上面的错误信息以获取更多细节。")
 
@@ -3,112 +3,267 @@
 
 import pandas as pd
 import os
-import json
-import re
-import aiofiles
 import asyncio
-from concurrent.futures import ProcessPoolExecutor  # 使用多进程
 from rich.progress import Progress  # 使用 rich 进度条
 from rich.console import Console
+from excel_reader import KEY_COLUMN, chunk_to_records
+from workbook_cache import open_chunk_reader
+from record_store import RecordStoreWriter
+from manifest import Manifest, MANIFEST_NAME
+from scheduler import run_bounded
+from file_writer import BatchFileWriter, submit_json
+from template_engine import template_columns
+from stage_timer import timer, call_with_timing
+from sheet_converter import convert_workbook
+from auto_tune import AutoTuner
+from shard import Shard, write_shard_file
 
 # 初始化 rich 控制台
 console = Console()
 
+# 项目根目录，可通过环境变量 YIHEYUAN_HOME 指定（如基准测试、多台机器分片运行）
+base_dir = os.environ.get('YIHEYUAN_HOME', '/home/bigyang/python_bigyang/yiheyuan')
+
 # Excel 文件路径（支持 .xls 和 .xlsx 文件）
-file_path = '/home/bigyang/python_bigyang/yiheyuan/excel/source.xlsx'  # 替换为实际的 Excel 文件路径
+file_path = os.environ.get('YIHEYUAN_EXCEL', os.path.join(base_dir, 'excel', 'source.xlsx'))  # 替换为实际的 Excel 文件路径
+
+# 是否流式读取 Excel（逐行读取并分批处理，内存占用与文件大小无关）；False 时一次性读取整个工作表
+streaming = True
+
+# 列投影：只读取 Word 模板中实际用到的列（以及作为文件名的“总登记号”），其余列不转换、不写入 JSON，
+# 适合列很多的工作表；False 读取所有列
+project_columns = False
+template_path = os.path.join(base_dir, 'word', 'temp.docx')
+
+# 工作表缓存目录（仅流式读取）：再次读取同一个工作簿时直接加载缓存，不再解析 Excel；工作簿修改后缓存自动失效。None 不使用缓存
+workbook_cache_dir = os.path.join(base_dir, 'cache')
+# 缓存目录总大小上限（字节），超过时删除最久未使用的缓存
+workbook_cache_max_bytes = 1024 * 1024 * 1024
+
+# 自动调优（见 auto_tune.py）：根据 CPU 核数和可用内存选择进程池或线程池、进程数和每批行数，
+# 运行中根据实测的处理速度和内存占用调整每个任务的行数和同时在途的任务数；False 时只在启动时选择一次
+auto_tune = True
+# 手动设置：None 由自动调优决定，设置后固定使用该值
+executor_type = None  # 'process' 进程池；'thread' 线程池
+max_workers = None  # 进程数，如 8 核 CPU 可设置为 8
+batch_size = None  # 每批读取的行数，根据系统内存情况可调整
+max_in_flight = None  # 同时在途的任务数上限，内存占用只与此窗口有关
+
+# 排队等待写入的文件数上限
+max_pending_writes = 100
+# 写入 JSON 文件的线程数，以及每次交给写入线程的文件数
+writer_threads = 4
+write_batch_size = 50
 
 # JSON 文件保存目录（如果不存在则创建）
-output_dir = '/home/bigyang/python_bigyang/yiheyuan/json/'
+output_dir = os.path.join(base_dir, 'json')
 os.makedirs(output_dir, exist_ok=True)
 
-# 函数：清理文件名中的非法字符和不可见字符
-def clean_filename(filename):
-    # 移除不可见字符（如零宽度空格、控制字符等）
-    filename = re.sub(r'[\u200B-\u200D\uFEFF]', '', filename)  # 移除零宽度字符
-    filename = re.sub(r'[^\w\s-]', '', filename)  # 移除非字母、数字、下划线、连字符和空格的字符
-    filename = filename.strip()  # 去除首尾空格
-    return filename
-
-# 异步函数：将字典写入 JSON 文件
-async def write_json(file_name, row_dict):
-    # 构建 JSON 文件的完整路径
-    json_file_path = os.path.join(output_dir, f'{file_name}.json')
-    
-    # 使用异步方式打开文件并写入 JSON 数据
-    async with aiofiles.open(json_file_path, 'w', encoding='utf-8') as json_file:
-        await json_file.write(json.dumps(row_dict, ensure_ascii=False, indent=4))
+# 分片运行（见 shard.py）：多台机器各处理一部分行，按“总登记号”的哈希确定性地分配，结束后在输出目录写入分片清单，
+# 用 shard.py 校验所有分片合起来恰好覆盖 Excel 中的每一行一次。通过环境变量 YIHEYUAN_SHARD=序号/总数（如 0/4）指定，
+# 也可以直接设置为 Shard(0, 4)；未指定时不分片，处理全部数据
+shard = Shard.from_env()
 
-# 多进程处理函数：处理每一行的 Excel 数据，转换为字典并生成文件名
-def process_row(index, row):
-    row_dict = row.to_dict()
-    
-    # 提取“总登记号”作为文件名，如果为空则使用行号作为文件名
-    file_name = row_dict.get('总登记号', f'row_{index+1}')
-    
-    # 清理文件名，确保合法性
-    file_name = clean_filename(file_name)
-    
-    # 将所有列数据转换为字符串类型，以确保写入 JSON 时为文本格式
-    for key in row_dict:
-        row_dict[key] = str(row_dict[key])
-    
-    return file_name, row_dict
+# 输出方式：'files' 每行写一个 JSON 文件；'jsonl' 所有记录追加写入一个记录库文件（附带按“总登记号”的索引）
+output_mode = 'files'
+record_store_path = os.path.join(output_dir, shard.file_name('records.jsonl'))
+
+# JSON 文件格式：False 缩进排版，便于阅读；True 紧凑格式（不缩进），文件约小一半、写入更快。
+# 安装了 orjson 时自动使用 orjson 序列化（见 json_codec.py）
+json_compact = False
+
+# 工作表：None 只转换第一个工作表；'all' 转换所有工作表；也可以是工作表名称列表，如 ['一号库房', '二号库房']。
+# 转换多个工作表时，每个工作表由一个进程独立处理，多个工作表同时转换
+sheets = None
+# 多个工作表的输出方式：'subdir' 每个工作表保存到输出目录下以工作表名称命名的子目录；
+# 'tag' 所有工作表保存到同一个目录，每条记录增加“工作表”字段，文件名为 工作表名_总登记号（避免不同工作表的文件互相覆盖）
+sheet_output = 'subdir'
+# 同时转换的工作表数，None 为可用的 CPU 核数
+sheet_workers = None
+
+# 增量模式（仅 'files' 输出）：根据清单跳过内容未变化的行，并删除 Excel 中已不存在的行对应的 JSON 文件
+incremental = True
+
+# 多进程处理函数：将一批 Excel 数据整体转换为 [(文件名, 字典), ...]，每批只需一次进程间传输；分片运行时只返回本分片的行
+def process_chunk(chunk):
+    with timer.stage('convert', len(chunk)):
+        return shard.select(chunk_to_records(chunk))
 
 # 函数：判断文件扩展名并读取 Excel 文件
-def read_excel(file_path):
+def read_excel(file_path, columns=None):
     _, ext = os.path.splitext(file_path)
+    # 列投影：只读取需要的列
+    usecols = None if columns is None else (lambda name: name in columns or name == KEY_COLUMN)
     
     # 根据文件扩展名选择正确的读取方式
     if ext == '.xls':
-        return pd.read_excel(file_path, dtype=str)  # 读取 .xls 文件，确保数据为字符串
+        return pd.read_excel(file_path, dtype=str, usecols=usecols)  # 读取 .xls 文件，确保数据为字符串
     elif ext == '.xlsx':
-        return pd.read_excel(file_path, dtype=str)  # 读取 .xlsx 文件，确保数据为字符串
+        return pd.read_excel(file_path, dtype=str, usecols=usecols)  # 读取 .xlsx 文件，确保数据为字符串
     else:
         raise ValueError("不支持的文件格式，请使用 .xls 或 .xlsx 文件。")
 
+# 函数：按批次读取 Excel 数据，返回总行数、分批迭代器和需要关闭的读取器
+def read_excel_chunks(file_path, batch_size):
+    columns = template_columns(template_path) if project_columns else None
+    if streaming:
+        # 流式读取：只在内存中保留当前批次
+        with timer.stage('excel_open'):
+            reader = open_chunk_reader(file_path, batch_size, columns, workbook_cache_dir, workbook_cache_max_bytes)
+        # 逐批读取的耗时即 Excel 解析耗时
+        return reader.total_rows, timer.iterate('excel_parse', reader, count=len), reader
+
+    with timer.stage('excel_parse'):
+        data = read_excel(file_path, columns)
+    total_records = len(data)
+    chunks = (data.iloc[i:i + batch_size] for i in range(0, total_records, batch_size))  # 手动分批读取数据
+    return total_records, chunks, None
+
+
+# 函数：多工作表模式：每个工作表一个进程，同时转换所有选中的工作表
+def convert_sheets():
+    columns = template_columns(template_path) if project_columns else None
+    # 每个工作表一个进程，进程数和每批行数由自动调优决定（手动设置优先）
+    tuner = AutoTuner('convert', 'process', sheet_workers, batch_size, adaptive=False)
+    options = dict(sheet_output=sheet_output, output_mode=output_mode, compact=json_compact, incremental=incremental,
+                   batch_size=tuner.chunk_size, columns=columns, cache_dir=workbook_cache_dir,
+                   cache_max_bytes=workbook_cache_max_bytes)
+    for result in convert_workbook(file_path, sheets, output_dir, tuner.workers, **options):
+        if 'error' in result:
+            console.print(f"[red]转换工作表 {result['sheet']} 时出错：{result['error']}[/red]")
+        else:
+            console.print(f"[green]工作表 {result['sheet']}：共 {result['rows']} 行，写出 {result['written']} 个文件，"
+                          f"删除 {result['removed']} 个过期文件，保存在 {result['output']}。[/green]")
+    # 开启计时（YIHEYUAN_TIMING=1）时输出各阶段耗时汇总
+    timing_file = timer.save(os.path.join(base_dir, 'log'), 'excel2json_multi')
+    if timing_file:
+        console.print(timer.report())
+        console.print(f"各阶段耗时汇总已保存到 {timing_file}。")
+
 # 主函数：处理 Excel 数据
 async def main():
-    # 读取 Excel 文件，并将所有数据加载为 DataFrame
+    if sheets is not None:
+        if shard.enabled:
+            console.print("[red]多工作表模式不支持分片运行，请只转换一个工作表或取消分片设置。[/red]")
+            return
+        convert_sheets()
+        return
+
+    tuner = AutoTuner('convert', executor_type, max_workers, batch_size, max_in_flight, auto_tune)
+    console.print(f"[blue]自动调优：{tuner.describe()}[/blue]")
+    if shard.enabled:
+        console.print(f"[blue]分片运行：{shard}[/blue]")
+
+    # 读取 Excel 文件（流式模式下按批次逐步读取）
     try:
-        data = read_excel(file_path)  # 调用读取函数，支持 .xls 和 .xlsx
+        total_records, chunks, reader = read_excel_chunks(file_path, tuner.chunk_size)  # 支持 .xls 和 .xlsx
     except Exception as e:
         console.print(f"[red]读取 Excel 文件时出错：{str(e)}[/red]")
         return
 
-    # 计算总行数
-    total_records = len(data)
+    store = RecordStoreWriter(record_store_path) if output_mode == 'jsonl' else None
+    # 分片运行时每个分片使用各自的清单，只管理本分片的行
+    manifest = Manifest(output_dir, name=shard.file_name(MANIFEST_NAME)) if incremental and output_mode == 'files' else None
+    complete = True  # 所有批次都处理成功
+    # 分片运行时记录本分片的所有行和处理失败的批次，结束后写入分片清单
+    shard_keys, failed_rows = [], []
+    # 写入线程：序列化后的 JSON 按批写入文件，排队的文件数有上限
+    writer = BatchFileWriter(writer_threads, max_pending_writes, write_batch_size) if store is None else None
+
+    try:
+        # 使用进程池（或核数较少时的线程池）来处理数据
+        with tuner.make_executor() as executor:
+            loop = asyncio.get_event_loop()
+
+            # 使用 rich 进度条
+            with Progress() as progress:
+                task = progress.add_task("[green]正在处理数据...", total=total_records)  # 初始化 rich 进度条
+
+                # 函数：转换一块数据并写出；出错的块记为失败，不影响其他块
+                async def handle_part(part):
+                    nonlocal complete
+                    try:
+                        if timer.enabled and tuner.executor == 'process':
+                            # 子进程中的转换耗时随结果一起返回
+                            records, stats = await loop.run_in_executor(executor, call_with_timing, process_chunk, part)
+                            timer.merge(stats)
+                        else:
+                            records = await loop.run_in_executor(executor, process_chunk, part)
+
+                        if store is not None:
+                            # 顺序追加到记录库
+                            with timer.stage('store_write', len(records)):
+                                store.write_many(records)
+                        else:
+                            if manifest is not None:
+                                # 只写出内容有变化的行
+                                with timer.stage('manifest', len(records)):
+                                    changed = manifest.filter_changed(records, lambda key: os.path.join(output_dir, f'{key}.json'))
+                            else:
+                                changed = records
+
+                            # 每一行数据交给写入线程写入单独的 JSON 文件，排队的文件数有上限
+                            submit_json(writer, changed, output_dir, json_compact)
+                            timer.count('written', len(changed))
+                    except Exception as e:
+                        complete = False
+                        timer.count('failed_rows', len(part))
+                        rows = f'第 {part.index[0] + 1} 至 {part.index[-1] + 1} 行'
+                        failed_rows.append(f'{rows}：{e}')
+                        console.print(f"[red]处理{rows}时出错：{e}[/red]")
+                        return  # 继续处理其他块
+                    finally:
+                        tuner.record(len(part))
+                        # 每处理一块，更新 rich 进度条
+                        progress.update(task, advance=len(part))
+                    timer.count('rows', len(records))
+                    if shard.enabled:
+                        shard_keys.extend(key for key, _ in records)
+
+                # 读取、转换和写入流水线执行：每批按调优器当前的任务大小切分，每个进程整块转换，完成一块再提交下一块
+                await run_bounded(handle_part, tuner.split(chunks), tuner.window)
+
+        if writer is not None:
+            # 等待所有文件写完；写入失败的行从清单中移除，下次重新写出
+            writer.close()
+            for path, error in writer.errors:
+                console.print(f"[red]无法写入 JSON 文件 {path}：{error}[/red]")
+            if writer.errors:
+                complete = False
+                if manifest is not None:
+                    for key in writer.failed_keys():
+                        manifest.discard(key)
+
+        if manifest is not None:
+            if complete:
+                # 删除 Excel 中已不存在的行对应的 JSON 文件（有块出错时不删除，避免误删）
+                removed = manifest.remove_stale()
+                if removed:
+                    console.print(f"[yellow]已删除 {len(removed)} 个过期的 JSON 文件。[/yellow]")
+            manifest.save()
 
-    # 设置批次大小，避免占用过多内存
-    batch_size = 500  # 根据系统内存情况可调整
-
-    # 使用多进程池来处理数据，max_workers 可以设置为系统的 CPU 核心数
-    with ProcessPoolExecutor(max_workers=8) as executor:  # 适合 8 核 CPU
-        loop = asyncio.get_event_loop()
-        
-        # 使用 rich 进度条
-        with Progress() as progress:
-            task = progress.add_task("[green]正在处理数据...", total=total_records)  # 初始化 rich 进度条
-            
-            for i in range(0, total_records, batch_size):
-                chunk = data.iloc[i:i + batch_size]  # 手动分批读取数据
-                tasks = []
-                
-                # 遍历当前批次的每一行
-                for index, row in chunk.iterrows():
-                    # 使用多进程池并行处理每一行数据
-                    file_name, row_dict = await loop.run_in_executor(executor, process_row, index, row)
-                    
-                    # 异步写入每一行数据到单独的 JSON 文件
-                    tasks.append(write_json(file_name, row_dict))
-                    
-                    # 每处理一行，更新 rich 进度条
-                    progress.update(task, advance=1)
-                
-                # 等待所有异步任务完成
-                await asyncio.gather(*tasks)
+        if shard.enabled:
+            # 处理失败的块和写入失败的行记为失败，校验时报告
+            failed = failed_rows + (writer.failed_keys() if writer is not None else [])
+            shard_file = write_shard_file(output_dir, shard, 'excel2json', shard_keys, failed,
+                                          '.json' if output_mode == 'files' else None)
+            console.print(f"[green]本分片共 {len(shard_keys)} 行，分片清单已保存到 {shard_file}。[/green]")
+    finally:
+        # 出错时也关闭读取器、写完记录库的索引并结束写入线程
+        if reader is not None:
+            reader.close()
+        if store is not None:
+            store.close()
+        if writer is not None:
+            writer.close()
+        # 开启计时（YIHEYUAN_TIMING=1）时输出各阶段耗时汇总
+        timing_file = timer.save(os.path.join(base_dir, 'log'), 'excel2json_multi')
+        if timing_file:
+            console.print(timer.report())
+            console.print(f"各阶段耗时汇总已保存到 {timing_file}。")
 
 if __name__ == "__main__":
     # 运行主程序
     asyncio.run(main())
-    console.print(f"[green]数据已导出到 {output_dir} 目录。[/green]")
+    console.print(f"[green]数据已导出到 {record_store_path if output_mode == 'jsonl' else output_dir}。[/green]")
 
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# Excel 直接生成 Word：读取 Excel 的每一行后直接在内存中填充 Word 模板，不经过中间 JSON 文件
+
+import os
+import json_codec
+import logging
+from functools import partial
+from datetime import datetime
+from rich.progress import Progress, TextColumn, BarColumn, TimeRemainingColumn
+from rich.console import Console
+from excel_reader import chunk_to_records
+from workbook_cache import open_chunk_reader
+from record_store import RecordStoreWriter
+from scheduler import bounded_map
+from template_engine import PLACEHOLDER_FIELDS, get_compiled_template, template_columns
+from stage_timer import timer, call_with_timing
+from auto_tune import AutoTuner
+from log_queue import setup_logging, init_worker_logging, RecordLog
+
+# 初始化 rich 控制台
+console = Console()
+
+# 项目根目录，可通过环境变量 YIHEYUAN_HOME 指定（如基准测试、多台机器分片运行）
+base_dir = os.environ.get('YIHEYUAN_HOME', '/home/bigyang/python_bigyang/yiheyuan')
+
+# 日志设置
+log_dir = os.path.join(base_dir, 'log')
+os.makedirs(log_dir, exist_ok=True)
+log_file = os.path.join(log_dir, f'excel2word_{datetime.now().strftime("%Y-%m-%d_%H-%M-%S")}.log')
+# 日志方式（见 log_queue.py）：True 所有进程的日志放入队列，由主进程的一个后台线程写入文件，各进程的日志行不会交错；
+# False 各进程直接写入日志文件（原来的方式）
+queued_logging = True
+log_queue = setup_logging(log_file, logging.INFO, '%(asctime)s - %(message)s', queued_logging)
+# 成功生成的文件的明细日志：'summary' 每 log_every 个文件汇总为一行；'sample' 每 log_every 个文件记录其中一个；
+# 'full' 每个文件都记录（原来的方式）。出错的记录始终单独记录
+log_detail = 'summary'
+log_every = 1000
+
+# Excel 文件路径（支持 .xls 和 .xlsx 文件）
+file_path = os.environ.get('YIHEYUAN_EXCEL', os.path.join(base_dir, 'excel', 'source.xlsx'))
+# word 模板文件路径
+template_path = os.path.join(base_dir, 'word', 'temp.docx')
+# 输出文件夹路径
+output_folder = os.path.join(base_dir, 'ok')
+os.makedirs(output_folder, exist_ok=True)
+
+# 可选：同时导出 JSON。None 不导出；'files' 每行一个 JSON 文件；'jsonl' 所有记录写入一个记录库文件
+json_output = None
+json_output_dir = os.path.join(base_dir, 'json')
+# 导出的 JSON 是否使用紧凑格式（不缩进）
+json_compact = False
+
+# 工作表缓存目录（仅流式读取）：再次读取同一个工作簿时直接加载缓存，不再解析 Excel；工作簿修改后缓存自动失效。None 不使用缓存
+workbook_cache_dir = os.path.join(base_dir, 'cache')
+# 缓存目录总大小上限（字节），超过时删除最久未使用的缓存
+workbook_cache_max_bytes = 1024 * 1024 * 1024
+
+# 自动调优（见 auto_tune.py）：根据 CPU 核数和可用内存选择进程池或线程池、进程数和每批行数，
+# 运行中根据实测的生成速度和内存占用调整每个任务的记录数和同时在途的任务数；False 时只在启动时选择一次
+auto_tune = True
+# 手动设置：None 由自动调优决定，设置后固定使用该值
+executor_type = None  # 'process' 进程池；'thread' 线程池
+max_workers = None  # 生成 Word 文件的进程数
+batch_size = None  # 每批读取的行数
+max_in_flight = None  # 同时在途的任务数上限，避免读取速度远快于生成速度时占满内存
+
+# 多进程处理函数：根据一批记录生成 Word 文件，返回成功生成的文件和失败的记录；成功的文件由主进程汇总记录日志
+def render_records(records):
+    with timer.stage('template_load'):
+        template = get_compiled_template(template_path)
+    succeeded, failed = [], []
+    for name, data in records:
+        output_file = os.path.join(output_folder, f'{name}.docx')
+        try:
+            # 空值的占位符保持原样，与 json2word_multi.py 一致
+            placeholders = {key: data.get(field) for key, field in PLACEHOLDER_FIELDS.items() if data.get(field)}
+            with timer.stage('fill'):
+                document_xml = template.render_document_xml(placeholders)
+            with timer.stage('save'):
+                template.save_document_xml(document_xml, output_file)
+            succeeded.append(output_file)
+        except Exception as e:
+            logging.error(f"处理记录 {name} 时出错: {str(e)}")
+            failed.append(name)
+    return succeeded, failed
+
+# 函数：把一批记录导出为独立的 JSON 文件
+def dump_json_files(records):
+    for file_name, row_dict in records:
+        json_file_path = os.path.join(json_output_dir, f'{file_name}.json')
+        with open(json_file_path, 'wb') as json_file:
+            json_file.write(json_codec.dumps(row_dict, json_compact))
+
+# 主函数：读取 Excel 并直接生成 Word 文件
+def main():
+    tuner = AutoTuner('render', executor_type, max_workers, batch_size, max_in_flight, auto_tune)
+    console.print(f"[blue]自动调优：{tuner.describe()}[/blue]")
+
+    try:
+        # 不导出 JSON 时只读取模板用到的列（列投影），其余列不需要转换
+        columns = None if json_output else template_columns(template_path)
+        with timer.stage('excel_open'):
+            reader = open_chunk_reader(file_path, tuner.chunk_size, columns, workbook_cache_dir, workbook_cache_max_bytes)
+    except Exception as e:
+        console.print(f"[red]读取 Excel 文件时出错：{str(e)}[/red]")
+        return
+
+    store = None
+    if json_output:
+        os.makedirs(json_output_dir, exist_ok=True)
+        if json_output == 'jsonl':
+            store = RecordStoreWriter(os.path.join(json_output_dir, 'records.jsonl'))
+
+    succeeded, failed = 0, []
+    record_log = RecordLog(log_detail, log_every, '成功生成 %d 个文件，累计 %d 个')
+    with reader, tuner.make_executor(initializer=init_worker_logging, initargs=(log_queue,)) as executor, Progress(
+        TextColumn("[bold blue]{task.description}"),
+        BarColumn(),
+        "[progress.percentage]{task.percentage:>3.1f}%",
+        TimeRemainingColumn(),
+    ) as progress:
+        task = progress.add_task("正在生成 Word 文件", total=reader.total_rows)
+
+        # 函数：逐批读取并转换数据，按调优器当前的任务大小切分成任务
+        def iter_tasks():
+            for chunk in timer.iterate('excel_parse', reader, count=len):
+                with timer.stage('convert', len(chunk)):
+                    records = chunk_to_records(chunk)
+                with timer.stage('json_write', len(records)):
+                    if json_output == 'files':
+                        dump_json_files(records)
+                    elif store is not None:
+                        store.write_many(records)
+
+                yield from tuner.split([records])
+
+        # 开启计时时，子进程的各阶段耗时随结果一起返回
+        with_timing = timer.enabled and tuner.executor == 'process'
+        fn = partial(call_with_timing, render_records) if with_timing else render_records
+        for _, result in bounded_map(executor, fn, iter_tasks(), tuner.window):
+            if with_timing:
+                result, stats = result
+                timer.merge(stats)
+            done, bad = result
+            for output_file in done:
+                record_log.add('成功生成文件: %s', output_file)
+            tuner.record(len(done) + len(bad))
+            succeeded += len(done)
+            failed.extend(bad)
+            progress.update(task, advance=len(done) + len(bad))
+
+    if store is not None:
+        store.close()
+
+    record_log.close()
+    logging.info(f"程序运行完毕，成功生成 {succeeded} 个文件，失败 {len(failed)} 个。")
+    console.print(f"[green]程序运行完毕，成功生成 {succeeded} 个文件，失败 {len(failed)} 个，请查看 {output_folder}。[/green]")
+
+    # 开启计时（YIHEYUAN_TIMING=1）时输出各阶段耗时汇总，与日志文件放在一起
+    timer.count('succeeded', succeeded)
+    timer.count('failed', len(failed))
+    timing_file = timer.save(log_dir, 'excel2word')
+    if timing_file:
+        console.print(timer.report())
+        console.print(f"各阶段耗时汇总已保存到 {timing_file}")
+
+if __name__ == "__main__":
+    main()
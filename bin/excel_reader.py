@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# 流式读取 Excel：逐行迭代工作表，按固定大小分块生成 DataFrame，不一次性载入整个工作表
+
+import os
+
+import pandas as pd
+
+
+# 函数：整理表头，与 pd.read_excel 的列名规则保持一致（空列名、重复列名）
+def _normalize_header(header):
+    columns, seen = [], {}
+    for i, name in enumerate(header):
+        name = f"Unnamed: {i}" if name is None or name == "" else str(name)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        columns.append(name)
+    return columns
+
+
+# 函数：转换单元格的值，与 pd.read_excel 的结果保持一致（空单元格为 NaN，整数值的浮点数转为整数）
+def _convert_value(value):
+    if value is None or value == "":
+        return float("nan")
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+# 函数：工作簿中所有工作表的名称（按工作簿中的顺序）
+def sheet_names(file_path):
+    file_ext = os.path.splitext(file_path)[1].lower()
+    if file_ext == '.xlsx':
+        import openpyxl
+        workbook = openpyxl.load_workbook(file_path, read_only=True)
+        try:
+            return list(workbook.sheetnames)
+        finally:
+            workbook.close()
+    if file_ext == '.xls':
+        import xlrd
+        workbook = xlrd.open_workbook(file_path, on_demand=True)
+        try:
+            return workbook.sheet_names()
+        finally:
+            workbook.release_resources()
+    raise ValueError(f"不支持的文件格式 '{file_ext}'，请使用 .xls 或 .xlsx 文件。")
+
+
+class ExcelChunkReader:
+    def __init__(self, file_path, chunk_size, columns=None, sheet=None):
+        # columns 为需要读取的列名（列投影），其余列不转换也不输出；None 读取所有列
+        # sheet 为工作表名称或序号；None 读取第一个工作表
+        self.file_path = file_path
+        self.chunk_size = chunk_size
+        self.file_ext = os.path.splitext(file_path)[1].lower()
+        self._workbook = None
+
+        if self.file_ext == '.xlsx':
+            import openpyxl
+            # 只读模式按需解析行，不构建完整的单元格对象树
+            self._workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+            sheet = self._workbook[sheet] if isinstance(sheet, str) else self._workbook.worksheets[sheet or 0]
+            self.sheet_name = sheet.title
+            self._rows = sheet.iter_rows(values_only=True)
+            max_row = sheet.max_row
+        elif self.file_ext == '.xls':
+            import xlrd
+            # on_demand 模式只加载需要的工作表，但 xlrd 访问工作表时仍会把整个工作表读入内存，.xls 无法真正流式读取：
+            # 这是 xlrd 的已知限制（.xls 最多 65536 行，内存占用有上限），调用方不要依赖 .xls 的内存占用只与批大小有关
+            self._workbook = xlrd.open_workbook(file_path, on_demand=True)
+            sheet = self._workbook.sheet_by_name(sheet) if isinstance(sheet, str) else self._workbook.sheet_by_index(sheet or 0)
+            self.sheet_name = sheet.name
+            self._rows = self._iter_xls_rows(sheet, self._workbook.datemode)
+            max_row = sheet.nrows
+        else:
+            raise ValueError(f"不支持的文件格式 '{self.file_ext}'，请使用 .xls 或 .xlsx 文件。")
+
+        header = next(self._rows, None) or ()
+        self.all_columns = _normalize_header(header)
+        self._width = len(self.all_columns)
+        if columns is None:
+            self._keep = None
+            self.columns = self.all_columns
+        else:
+            self._keep = select_columns(self.all_columns, columns)
+            self.columns = [self.all_columns[i] for i in self._keep]
+        # 工作表记录的行数（不含表头），仅用于显示进度
+        self.total_rows = max(max_row - 1, 0) if max_row else 0
+
+    # 函数：逐行读取 .xls 工作表
+    @staticmethod
+    def _iter_xls_rows(sheet, datemode):
+        import xlrd
+        for i in range(sheet.nrows):
+            row = []
+            for cell in sheet.row(i):
+                if cell.ctype == xlrd.XL_CELL_DATE:
+                    row.append(xlrd.xldate_as_datetime(cell.value, datemode))
+                elif cell.ctype == xlrd.XL_CELL_BOOLEAN:
+                    row.append(bool(cell.value))
+                elif cell.ctype in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK, xlrd.XL_CELL_ERROR):
+                    row.append(None)
+                else:
+                    row.append(cell.value)
+            yield tuple(row)
+
+    # 函数：按固定大小分块，每块是一个以 Excel 行号（从 0 开始，不含表头）为索引的 DataFrame
+    def __iter__(self):
+        width, keep = self._width, self._keep
+        rows, index = [], []
+        for row_number, values in enumerate(self._rows):
+            # 跳过整行为空的行（按整行判断，投影前后行号和文件名保持一致）
+            if all(v is None or v == "" for v in values):
+                continue
+            values = list(values[:width]) + [None] * (width - len(values))
+            if keep is not None:
+                values = [values[i] for i in keep]
+            rows.append([_convert_value(v) for v in values])
+            index.append(row_number)
+            if len(rows) >= self.chunk_size:
+                yield pd.DataFrame(rows, columns=self.columns, index=index, dtype=object)
+                rows, index = [], []
+        if rows:
+            yield pd.DataFrame(rows, columns=self.columns, index=index, dtype=object)
+
+    def close(self):
+        if self._workbook is None:
+            return
+        if self.file_ext == '.xlsx':
+            self._workbook.close()
+        else:
+            self._workbook.release_resources()
+        self._workbook = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# 作为文件名（记录键）的列
+KEY_COLUMN = '总登记号'
+
+
+# 函数：列投影，返回需要读取的列在表头中的位置（保持表头顺序）；始终保留作为文件名的列
+def select_columns(header, columns):
+    wanted = set(columns) | {KEY_COLUMN}
+    return [i for i, name in enumerate(header) if name in wanted]
+
+
+# 函数：按列批量清理文件名中的非法字符和不可见字符
+def clean_filenames(names):
+    names = names.str.replace(r'[\u200B-\u200D\uFEFF]', '', regex=True)  # 移除零宽度字符
+    names = names.str.replace(r'[^\w\s-]', '', regex=True)  # 移除非字母、数字、下划线、连字符和空格的字符
+    return names.str.strip()  # 去除首尾空格
+
+
+# 函数：按列批量清理单元格的值：移除零宽度字符，去除首尾空白（图形界面一直对每个单元格这样处理）
+def clean_values(text):
+    return text.apply(lambda column: column.str.replace(r'[\u200B-\u200D\uFEFF]', '', regex=True).str.strip())
+
+
+# 函数：将一批数据整体转换为记录列表 [(文件名, 行字典), ...]；
+# clean=True 时清理每个单元格的值（见 clean_values），空单元格为 None（写为 JSON 的 null），而不是字符串 'nan'
+def chunk_to_records(chunk, clean=False):
+    # 按列将所有值转换为字符串类型
+    text = chunk.astype(str)
+    if clean:
+        text = clean_values(text).where(chunk.notna(), None)
+
+    # 如果“总登记号”为空，使用行号作为文件名
+    fallback = pd.Series([f'row_{index + 1}' for index in chunk.index], index=chunk.index)
+    if KEY_COLUMN in chunk.columns:
+        names = clean_filenames(text[KEY_COLUMN]).where(chunk[KEY_COLUMN].notna(), '')
+        names = names.mask(names == '', fallback)
+    else:
+        names = fallback
+
+    return list(zip(names.tolist(), text.to_dict('records')))
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# 批量写文件：少量常驻写入线程从队列中按批取出已序列化的数据写入文件，
+# 代替每个文件一个 aiofiles 协程（每次打开、写入、关闭都要切换一次线程）。
+# 队列有容量上限，写入跟不上时提交方会等待，内存占用与数据量无关
+
+import os
+import queue
+import threading
+
+import json_codec
+from stage_timer import timer
+
+
+class BatchFileWriter:
+    def __init__(self, threads=4, max_pending=1000, batch_size=64, atomic=False):
+        # threads 为写入线程数；max_pending 为排队等待写入的文件数上限；batch_size 为每批交给写入线程的文件数；
+        # atomic=True 时先写入临时文件再改名，中途取消或出错时不会留下写了一半的文件
+        self.batch_size = max(1, batch_size)
+        self.atomic = atomic
+        self.cancelled = False
+        self._queue = queue.Queue(maxsize=max(1, max_pending // self.batch_size))
+        self._batch = []
+        self._lock = threading.Lock()
+        self.written = 0
+        # 写入失败的文件 [(路径, 错误信息), ...]
+        self.errors = []
+        self._threads = [threading.Thread(target=self._run, daemon=True) for _ in range(max(1, threads))]
+        for thread in self._threads:
+            thread.start()
+
+    # 写入线程：逐批取出并写入文件
+    def _run(self):
+        while True:
+            batch = self._queue.get()
+            try:
+                if batch is None:
+                    return
+                written, errors = 0, []
+                for path, data in batch:
+                    if self.cancelled:
+                        # 已取消：丢弃排队中的文件
+                        break
+                    try:
+                        with timer.stage('write'):
+                            self._write(path, data)
+                        written += 1
+                    except OSError as e:
+                        errors.append((path, str(e)))
+                with self._lock:
+                    self.written += written
+                    self.errors.extend(errors)
+            finally:
+                self._queue.task_done()
+
+    # 函数：写入一个文件
+    def _write(self, path, data):
+        if not self.atomic:
+            with open(path, 'wb') as f:
+                f.write(data)
+            return
+        tmp_path = f'{path}.part'
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    # 函数：提交一个文件（路径和字节内容）；凑满一批后交给写入线程，队列已满时等待（只能在一个线程中提交）
+    def submit(self, path, data):
+        if self.cancelled:
+            return
+        self._batch.append((path, data))
+        if len(self._batch) >= self.batch_size:
+            self._queue.put(self._batch)
+            self._batch = []
+
+    # 函数：提交不足一批的剩余文件并等待所有文件写完
+    def flush(self):
+        if self._batch:
+            self._queue.put(self._batch)
+            self._batch = []
+        self._queue.join()
+
+    # 函数：取消（在提交文件的线程中调用）：不再接受新文件，排队中尚未写入的文件直接丢弃，正在写入的文件写完为止
+    def cancel(self):
+        self.cancelled = True
+        self._batch = []
+
+    # 函数：写完所有文件并结束写入线程
+    def close(self):
+        if not self._threads:
+            return
+        self.flush()
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    # 函数：写入失败的文件对应的键（文件名去掉后缀）
+    def failed_keys(self):
+        return [os.path.splitext(os.path.basename(path))[0] for path, _ in self.errors]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# 函数：序列化一批记录 [(键, 字典), ...] 并交给写入线程，每条记录写为 output_dir/键.json
+def submit_json(writer, records, output_dir, compact=False):
+    for key, record in records:
+        with timer.stage('serialize'):
+            data = json_codec.dumps(record, compact)
+        writer.submit(os.path.join(output_dir, f'{key}.json'), data)
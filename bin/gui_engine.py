@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# 图形界面的后台引擎：转换在后台线程（及其进程池/线程池）中执行，界面线程不会被阻塞。
+# 进度按时间间隔节流后回调，携带实际完成的数量、速度和预计剩余时间；可以随时取消，
+# 取消后尽快停止，已写出的文件都是完整的（先写临时文件再改名）
+
+import os
+import time
+import threading
+import multiprocessing
+from functools import partial
+
+import json_codec
+from auto_tune import AutoTuner
+from excel_reader import chunk_to_records
+from file_writer import BatchFileWriter, submit_json
+from scheduler import bounded_map
+from sheet_converter import convert_workbook, select_sheets
+from stage_timer import timer, call_with_timing
+from template_engine import get_compiled_template
+from workbook_cache import open_chunk_reader
+
+# 两次进度回调之间的最短间隔（秒），避免大量事件堆积在界面线程
+PROGRESS_INTERVAL = 0.2
+
+# 图形界面使用的 Word 模板中的占位符与 JSON 字段的对应关系（与 template_engine.PLACEHOLDER_FIELDS 不同：
+# 名称的占位符为 mingcheng，且只有 18 个字段）；数据中没有的字段替换为空
+GUI_PLACEHOLDER_FIELDS = {
+    "year": "年", "month": "月", "day": "日", "zongdengjihao": "总登记号",
+    "fenleihao": "分类号", "mingcheng": "名称", "niandai": "年代", "jianshu": "件数",
+    "danwei": "单位", "chicun": "尺寸", "zhongliang": "重量", "zhidi": "质地",
+    "wancanqingkuang": "完残情况", "laiyuan": "来源", "ruguanpingzhenghao": "入馆凭证号",
+    "zhuxiaopingzhenghao": "注销凭证号", "jibie": "级别", "beizhu": "备注",
+}
+
+
+# 函数：秒数格式化为 时:分:秒，用于显示已用时间和预计剩余时间
+def format_seconds(seconds):
+    seconds = int(seconds)
+    return f'{seconds // 3600:d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}'
+
+
+class BackgroundJob:
+    # work(job) 在后台线程中执行并返回结果字典，其中通过 job.cancelled 检查是否已取消，通过 job.advance 报告进度；
+    # on_progress(进度字典) 和 on_finish(结果字典) 在后台线程中调用，界面程序需用 wx.CallAfter 转到界面线程
+    def __init__(self, work, on_progress=None, on_finish=None, interval=PROGRESS_INTERVAL):
+        self.work = work
+        self.on_progress = on_progress
+        self.on_finish = on_finish
+        self.interval = interval
+        # 使用 multiprocessing.Event，取消标志可以传给进程池中的子进程
+        self.cancel_event = multiprocessing.Event()
+        self.total = 0
+        self.done = 0
+        self.items = 0
+        self.errors = 0
+        self._started = None
+        self._last_report = 0.0
+        self._thread = None
+
+    # 函数：在后台线程中开始执行
+    def start(self):
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    # 函数：请求取消（可在界面线程中调用）
+    def cancel(self):
+        self.cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    # 函数：是否仍在执行
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    # 函数：等待执行结束
+    def wait(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    # 函数：设置总数（如总行数、文件数）
+    def set_total(self, total):
+        self.total = total
+        self._report(force=True)
+
+    # 函数：报告完成 n 个单位；items 为其中包含的条数（默认与 n 相同，如按工作表计数时为行数），errors 为出错的数量
+    def advance(self, n=1, items=None, errors=0):
+        self.done += n
+        self.items += n if items is None else items
+        self.errors += errors
+        self._report()
+
+    # 函数：当前进度 {完成数、总数、条数、每秒条数、出错数、已用时间、预计剩余时间}
+    def progress(self):
+        elapsed = time.perf_counter() - self._started if self._started else 0.0
+        eta = None
+        if self.done and self.total:
+            eta = elapsed * (self.total - self.done) / self.done
+        return {'done': self.done, 'total': self.total, 'items': self.items,
+                'items_per_second': self.items / elapsed if elapsed else 0.0,
+                'errors': self.errors, 'elapsed': elapsed, 'eta': eta}
+
+    def _report(self, force=False):
+        if self.on_progress is None:
+            return
+        now = time.perf_counter()
+        if force or now - self._last_report >= self.interval:
+            self._last_report = now
+            self.on_progress(self.progress())
+
+    def _run(self):
+        try:
+            result = self.work(self) or {}
+        except Exception as e:
+            result = {'error': str(e)}
+        result['cancelled'] = self.cancelled
+        result.update(self.progress())
+        # 最后一次进度不节流，界面显示最终数量
+        self._report(force=True)
+        if self.on_finish is not None:
+            self.on_finish(result)
+
+
+# 函数：后台任务：Excel 转为独立的 JSON 文件，进度按行计数；与原来的图形界面一样清理每个单元格的值
+# （移除零宽度字符、去除首尾空白，空单元格写为 null），其余与 excel2json.py 的输出相同；
+# all_sheets=True 时每个工作表一个进程同时转换，分别保存到以工作表名称命名的子目录，进度按工作表计数
+def excel_to_json(job, file_path, output_dir, all_sheets=False, compact=False):
+    if all_sheets:
+        return _all_sheets_to_json(job, file_path, output_dir, compact)
+
+    tuner = AutoTuner('convert')
+    with timer.stage('excel_open'):
+        reader = open_chunk_reader(file_path, tuner.chunk_size)
+    job.set_total(reader.total_rows)
+    writer = BatchFileWriter(atomic=True)
+    executor = tuner.make_executor()
+
+    # 函数：读取并切分任务，取消后不再读取
+    def iter_tasks():
+        for part in tuner.split(timer.iterate('excel_parse', reader, count=len)):
+            if job.cancelled:
+                return
+            yield part
+
+    try:
+        for part, records in bounded_map(executor, partial(chunk_to_records, clean=True), iter_tasks(), tuner.window):
+            if job.cancelled:
+                break
+            submit_json(writer, records, output_dir, compact)
+            tuner.record(len(part))
+            job.advance(len(part))
+    finally:
+        if job.cancelled:
+            writer.cancel()
+        # 取消时尚未开始的任务直接丢弃
+        executor.shutdown(wait=True, cancel_futures=True)
+        writer.close()
+        reader.close()
+    job.errors += len(writer.errors)
+    timer.count('rows', writer.written)
+    return {'written': writer.written, 'write_errors': writer.errors}
+
+
+# 函数：多工作表转换（见 sheet_converter.py），取消标志传给各个子进程
+def _all_sheets_to_json(job, file_path, output_dir, compact):
+    sheets = select_sheets(file_path, 'all')
+    job.set_total(len(sheets))
+    tuner = AutoTuner('convert', 'process', adaptive=False)
+    written, sheet_errors = 0, []
+    for result in convert_workbook(file_path, sheets, output_dir, tuner.workers, cancel_event=job.cancel_event,
+                                   compact=compact, incremental=False, batch_size=tuner.chunk_size, atomic=True,
+                                   clean=True):
+        if 'error' in result:
+            sheet_errors.append((result['sheet'], result['error']))
+        written += result.get('written', 0)
+        job.advance(1, items=result.get('rows', 0), errors=1 if 'error' in result else 0)
+    return {'written': written, 'sheet_errors': sheet_errors}
+
+
+# 生成 Word 的工作进程中常驻的模板、占位符和取消标志，由 _init_render_worker 在进程启动时设置一次
+_render_template = None
+_render_placeholders = None
+_render_cancel = None
+
+
+# 进程初始化：每个进程只编译一次模板，之后所有任务复用（常驻进程）
+def _init_render_worker(template_path, placeholders, cancel_event):
+    global _render_template, _render_placeholders, _render_cancel
+    _render_template = get_compiled_template(template_path, placeholders)
+    _render_placeholders = placeholders
+    _render_cancel = cancel_event
+
+
+# 函数：在工作进程中根据一组 JSON 文件生成 Word 文件，返回 (成功数量, [(JSON 文件, 错误信息), ...])；
+# 先写入临时文件再改名，取消时已开始的文件写完为止，不会留下不完整的文件
+def _render_json_files(tasks):
+    succeeded, failed = 0, []
+    for json_path, output_file in tasks:
+        if _render_cancel is not None and _render_cancel.is_set():
+            break
+        tmp_path = f'{output_file}.part'
+        try:
+            with timer.stage('json_load'):
+                data = json_codec.load(json_path)
+            mapping = {}
+            for placeholder, field in _render_placeholders.items():
+                value = data.get(field)
+                mapping[placeholder] = '' if value is None else str(value)
+            with timer.stage('fill'):
+                document_xml = _render_template.render_document_xml(mapping)
+            with timer.stage('save'):
+                _render_template.save_document_xml(document_xml, tmp_path)
+                os.replace(tmp_path, output_file)
+            succeeded += 1
+        except Exception as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            failed.append((json_path, str(e)))
+    return succeeded, failed
+
+
+# 函数：后台任务：JSON 文件夹中的每个 JSON 文件生成一个 Word 文件（与 json2word_multi.py 相同的常驻进程池和编译模板），
+# 进度按文件计数；出错的文件不影响其他文件，在结果中汇总
+def json_to_word(job, json_dir, output_dir, template_path, placeholders=GUI_PLACEHOLDER_FIELDS):
+    json_files = sorted(f for f in os.listdir(json_dir) if f.endswith('.json'))
+    tasks = [(os.path.join(json_dir, f), os.path.join(output_dir, f'{os.path.splitext(f)[0]}.docx')) for f in json_files]
+    job.set_total(len(tasks))
+
+    tuner = AutoTuner('render')
+    executor = tuner.make_executor(initializer=_init_render_worker,
+                                   initargs=(template_path, placeholders, job.cancel_event))
+    with_timing = timer.enabled and tuner.executor == 'process'
+    fn = partial(call_with_timing, _render_json_files) if with_timing else _render_json_files
+
+    # 函数：按调优器当前的任务大小切分文件列表，取消后不再提交
+    def iter_tasks():
+        for part in tuner.split([tasks]):
+            if job.cancelled:
+                return
+            yield part
+
+    succeeded, failed = 0, []
+    try:
+        for part, result in bounded_map(executor, fn, iter_tasks(), tuner.window):
+            if with_timing:
+                result, stats = result
+                timer.merge(stats)
+            ok, bad = result
+            succeeded += ok
+            failed.extend(bad)
+            tuner.record(ok + len(bad))
+            job.advance(ok + len(bad), errors=len(bad))
+        # 取消后不再提交新任务，工作进程在当前文件写完后停止，已在途任务的结果仍然计入
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+    timer.count('succeeded', succeeded)
+    timer.count('failed', len(failed))
+    return {'succeeded': succeeded, 'failed': failed}
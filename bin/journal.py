@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# 断点续跑日志：长时间运行时每完成一个输入就在日志文件末尾追加一行（只追加、不改写），每若干行同步到磁盘（fsync）一次。
+# 运行中断（崩溃、断电、被终止）后重新运行时读取日志，跳过已完成且输出文件完好的输入，只重新处理失败和尚未处理的输入；
+# 全部成功后删除日志，下次运行从头开始（是否需要重新生成由增量清单决定）
+
+import os
+import json
+import zipfile
+
+# 日志文件名（保存在输出目录中，不使用 .json 后缀，避免被当作数据文件读取）
+JOURNAL_NAME = '.journal'
+# 日志格式版本，格式变化后旧日志不再使用
+JOURNAL_VERSION = 1
+
+
+class Journal:
+    # path 为日志文件路径；template_hash 为模板哈希，与日志中记录的不同时（模板已修改）旧日志作废；
+    # sync_every 为每追加多少行 fsync 一次，两次同步之间崩溃最多只会让这些输入重新处理
+    def __init__(self, path, template_hash='', sync_every=200):
+        self.path = path
+        self.template_hash = template_hash
+        self.sync_every = max(1, sync_every)
+        # {键: (是否成功, 内容哈希)}，同一个键以最后一行为准
+        self.entries = {}
+        self.resumed = False
+        self._pending = 0
+
+        valid_size = self._load()
+        if self.resumed:
+            # 截掉崩溃时只写了一半的最后一行，之后追加的行才能正确分隔
+            self._file = open(path, 'r+b')
+            self._file.truncate(valid_size)
+            self._file.seek(valid_size)
+        else:
+            self._file = open(path, 'wb')
+            self._write({'journal': JOURNAL_VERSION, 'template': template_hash})
+            self.sync()
+
+    # 函数：读取已有的日志，返回最后一个完整行的结束位置；日志不存在、版本或模板不一致时不续跑
+    def _load(self):
+        if not os.path.exists(self.path):
+            return 0
+        valid_size = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                if valid_size == 0:
+                    if entry.get('journal') != JOURNAL_VERSION or entry.get('template') != self.template_hash:
+                        return 0
+                    self.resumed = True
+                else:
+                    self.entries[entry['key']] = (entry['ok'], entry.get('hash'))
+                valid_size += len(line)
+        return valid_size
+
+    def _write(self, entry):
+        self._file.write(json.dumps(entry, ensure_ascii=False).encode('utf-8') + b'\n')
+        # 每行都写入操作系统，进程崩溃时不会丢失；断电时只丢失最近一次同步之后的行
+        self._file.flush()
+
+    # 函数：是否已成功完成且无需重新处理：content_hash 与完成时记录的一致（输入在此之后没有变化；没有记录哈希的一律重新处理），
+    # 输出文件存在且是完整的 Word 文件（ZIP 目录完好），写了一半的文件不会被当作已完成
+    def is_done(self, key, output_path, content_hash):
+        entry = self.entries.get(key)
+        if entry is None or not entry[0] or entry[1] is None or entry[1] != content_hash:
+            return False
+        return zipfile.is_zipfile(output_path)
+
+    # 函数：上次运行中处理失败的键
+    def failed_keys(self):
+        return [key for key, (ok, _) in self.entries.items() if not ok]
+
+    # 函数：追加一条处理结果及输入的内容哈希，每 sync_every 行同步到磁盘一次
+    def record(self, key, ok, content_hash):
+        self._write({'key': key, 'ok': bool(ok), 'hash': content_hash})
+        self.entries[key] = (bool(ok), content_hash)
+        self._pending += 1
+        if self._pending >= self.sync_every:
+            self.sync()
+
+    # 函数：把已写入的行同步到磁盘
+    def sync(self):
+        os.fsync(self._file.fileno())
+        self._pending = 0
+
+    def close(self):
+        if self._file is None:
+            return
+        self.sync()
+        self._file.close()
+        self._file = None
+
+    # 函数：全部完成后删除日志
+    def remove(self):
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -2,86 +2,136 @@
 # encoding: utf-8
 
 import os
-import json
+import json_codec
 from datetime import datetime
 from docx import Document
 from tqdm import tqdm  # To add a progress bar
 import logging
+from record_store import RecordStore, is_record_store
+from template_engine import PLACEHOLDER_FIELDS, PlaceholderMatcher, fill_document, get_compiled_template
+from stage_timer import timer
+from log_queue import setup_logging, RecordLog
+
+# 项目根目录，可通过环境变量 YIHEYUAN_HOME 指定（如基准测试、多台机器分片运行）
+base_dir = os.environ.get('YIHEYUAN_HOME', '/Users/bigyang/myapp/yiheyuan')
 
 # 设置日志文件路径和名称
-log_folder = "/Users/bigyang/myapp/yiheyuan/log"
+log_folder = os.path.join(base_dir, 'log')
 os.makedirs(log_folder, exist_ok=True)
 log_filename = os.path.join(log_folder, f"json2word_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log")
-logging.basicConfig(filename=log_filename, level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# 日志方式（见 log_queue.py）：True 日志交给后台线程写入文件，不拖慢生成；False 每条日志直接写入文件（原来的方式）
+queued_logging = True
+# 每个文件的明细日志：'summary' 每 log_every 个文件汇总为一行；'sample' 每 log_every 个文件记录其中一个；
+# 'full' 每个文件都记录，并记录替换的每个占位符（原来的方式，日志量大）。出错的文件始终单独记录
+log_detail = 'summary'
+log_every = 1000
+setup_logging(log_filename, logging.INFO, '%(asctime)s - %(levelname)s - %(message)s', queued_logging)
+record_log = RecordLog(log_detail, log_every, '已生成 %d 个 Word 文件，累计 %d 个')
 
 # 设置模板路径和输出文件夹
-template_path = "/Users/bigyang/myapp/yiheyuan/word/temp.docx"
-output_folder = "/Users/bigyang/myapp/yiheyuan/ok"
+template_path = os.path.join(base_dir, 'word', 'temp.docx')
+output_folder = os.path.join(base_dir, 'ok')
 os.makedirs(output_folder, exist_ok=True)
 
-# 占位符与JSON字段的映射
+# 是否使用编译模板（模板只解析一次，逐条记录直接填充占位符）；False 时使用 python-docx 逐个文件解析模板
+use_compiled_template = True
+
+# 所有占位符预编译为一个匹配器（长占位符优先）
+placeholder_matcher = PlaceholderMatcher(PLACEHOLDER_FIELDS)
+
+# 占位符与JSON字段的映射（空值替换为空字符串）
+def map_json_to_placeholders(data):
+    mapping = {}
+    for key, field in PLACEHOLDER_FIELDS.items():
+        value = data.get(field)
+        mapping[key] = str(value) if value else ""
+    return mapping
+
+# 替换文档段落和表格中的占位符
 def replace_placeholders(doc, data):
-    mapping = {
-        "year": data.get("年"),
-        "month": data.get("月"),
-        "day": data.get("日"),
-        "zongdengjihao": data.get("总登记号"),
-        "fenleihao": data.get("分类号"),
-        "name": data.get("名称"),
-        "niandai": data.get("年代"),
-        "jianshu": data.get("件数"),
-        "danwei": data.get("单位"),
-        "chicun": data.get("尺寸"),
-        "zhongliang": data.get("重量"),
-        "zhidi": data.get("质地"),
-        "wancanqingkuang": data.get("完残情况"),
-        "laiyuan": data.get("来源"),
-        "ruguanpingzhenghao": data.get("入馆凭证号"),
-        "zhuxiaopingzhenghao": data.get("注销凭证号"),
-        "jibie": data.get("级别"),
-        "beizhu": data.get("备注"),
-        "fuzeren": data.get("负责人"),
-        "danganbianhao": data.get("档案编号"),
-        "xingzhuangneirongmiaoshu": data.get("形状内容描述"),
-        "dangqianbaocuntiaojian": data.get("当前保存条件"),
-        "mingjitiba": data.get("铭记题跋")
-
-    }
-
-    for paragraph in doc.paragraphs:
-        for key, value in mapping.items():
-            if key in paragraph.text:
-                logging.info(f"Replacing placeholder: {key} with {value}")
-                paragraph.text = paragraph.text.replace(f"{key}", str(value) if value else "")
-
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                for key, value in mapping.items():
-                    if key in cell.text:
-                        logging.info(f"Replacing placeholder in table: {key} with {value}")
-                        cell.text = cell.text.replace(f"{key}", str(value) if value else "")
+    mapping = map_json_to_placeholders(data)
+    # 一次扫描替换所有占位符，每个段落和单元格只改写一次
+    hits = fill_document(doc, mapping, placeholder_matcher)
+    # 每个占位符一行的明细只在 'full' 方式下记录
+    if log_detail == 'full':
+        for key in hits:
+            logging.info("Replacing placeholder: %s with %s", key, mapping[key])
+
+# 根据一条记录生成 Word 文件
+def render_record(name, data):
+    output_filename = os.path.join(output_folder, f"{name}.docx")
+
+    if use_compiled_template:
+        # 使用编译模板直接填充占位符并生成 Word 文件
+        with timer.stage('template_load'):
+            template = get_compiled_template(template_path)
+        with timer.stage('fill'):
+            document_xml = template.render_document_xml(map_json_to_placeholders(data))
+        with timer.stage('save'):
+            template.save_document_xml(document_xml, output_filename)
+    else:
+        # 读取模板文件
+        with timer.stage('template_load'):
+            doc = Document(template_path)
+
+        # 替换占位符
+        with timer.stage('fill'):
+            replace_placeholders(doc, data)
+
+        # 生成 Word 文件
+        with timer.stage('save'):
+            doc.save(output_filename)
+    timer.count('succeeded')
+    record_log.add("Word document saved as: %s", output_filename)
 
 # 单线程处理每个JSON文件
 def process_single_file(json_filename):
-    logging.info(f"Processing file: {json_filename}")
-    with open(json_filename, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    
-    # 读取模板文件
-    doc = Document(template_path)
-    
-    # 替换占位符
-    replace_placeholders(doc, data)
-    
-    # 生成 Word 文件
-    output_filename = os.path.join(output_folder, os.path.basename(json_filename).replace(".json", ".docx"))
-    doc.save(output_filename)
-    logging.info(f"Word document saved as: {output_filename}")
+    if log_detail == 'full':
+        logging.info("Processing file: %s", json_filename)
+    with timer.stage('json_load'):
+        data = json_codec.load(json_filename)
+
+    render_record(os.path.splitext(os.path.basename(json_filename))[0], data)
+
+# 从记录库（records.jsonl）顺序读取并处理所有记录
+def process_record_store(store_path):
+    with RecordStore(store_path) as store:
+        total_files = len(store)
+        print(f"正在处理 {total_files} 条记录，请稍候...")
+        logging.info(f"开始处理记录库 {store_path} 中的 {total_files} 条记录。")
+
+        for name, data in tqdm(timer.iterate('json_load', store), total=total_files, desc="处理进度"):
+            try:
+                if log_detail == 'full':
+                    logging.info("Processing record: %s", name)
+                render_record(name, data)
+            except Exception as e:
+                timer.count('failed')
+                logging.error(f"处理记录 {name} 时出错: {e}")
+                print(f"处理记录 {name} 时出错: {e}")
+
+    record_log.close()
+    print(f"程序运行完毕，一共生成 {total_files} 个文件，请查看。")
+    logging.info(f"程序运行完毕，生成 {total_files} 个文件。")
 
 # 主函数
 def main():
-    json_folder = input("请输入 JSON 文件夹路径: ")
+    try:
+        run()
+    finally:
+        # 开启计时（YIHEYUAN_TIMING=1）时输出各阶段耗时汇总，与日志文件放在一起
+        timing_file = timer.save(log_folder, 'json2word')
+        if timing_file:
+            print(timer.report())
+            print(f"各阶段耗时汇总已保存到 {timing_file}")
+
+# 读取输入路径并处理所有数据
+def run():
+    json_folder = input("请输入 JSON 文件夹路径（或 records.jsonl 记录库文件路径）: ")
+    if is_record_store(json_folder):
+        process_record_store(json_folder)
+        return
+
     if not os.path.isdir(json_folder):
         print("输入的文件夹路径不存在，请重新输入。")
         logging.error("输入的文件夹路径不存在。")
@@ -103,9 +153,11 @@ def main():
         try:
             process_single_file(json_filename)
         except Exception as e:
+            timer.count('failed')
             logging.error(f"处理文件 {json_filename} 时出错: {e}")
             print(f"处理文件 {json_filename} 时出错: {e}")
     
+    record_log.close()
     print(f"程序运行完毕，一共生成 {total_files} 个文件，请查看。")
     logging.info(f"程序运行完毕，生成 {total_files} 个文件。")
 
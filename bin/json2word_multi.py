@@ -1,100 +1,257 @@
 #!/usr/bin/env python
 # encoding: utf-8
 
+import io
 import os
-import json
+import re
+import copy
+import json_codec
 import logging
+from functools import partial
 from docx import Document
-from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
 from rich.progress import Progress, TextColumn, BarColumn, TimeRemainingColumn
-from multiprocessing import cpu_count
+from record_store import RecordStore
+from manifest import Manifest, MANIFEST_NAME, file_hash, json_file_hash, record_hash
+from scheduler import bounded_map
+from docx_archive import ArchiveWriter
+from template_engine import PLACEHOLDER_FIELDS, PlaceholderMatcher, fill_document, get_compiled_template
+from stage_timer import timer, call_with_timing
+from auto_tune import AutoTuner
+from log_queue import setup_logging, init_worker_logging, RecordLog
+from shard import Shard, write_shard_file
+from journal import Journal, JOURNAL_NAME
+
+# 项目根目录，可通过环境变量 YIHEYUAN_HOME 指定（如基准测试、多台机器分片运行）
+base_dir = os.environ.get('YIHEYUAN_HOME', '/home/bigyang/python_bigyang/yiheyuan')
 
 # 日志设置
-log_dir = '/home/bigyang/python_bigyang/yiheyuan/log'
+log_dir = os.path.join(base_dir, 'log')
 if not os.path.exists(log_dir):
     os.makedirs(log_dir)
 log_file = os.path.join(log_dir, f'{datetime.now().strftime("%Y-%m-%d_%H-%M-%S")}.log')
-logging.basicConfig(filename=log_file, level=logging.INFO, format='%(asctime)s - %(message)s')
+# 日志方式（见 log_queue.py）：True 所有进程的日志放入队列，由主进程的一个后台线程写入文件，各进程的日志行不会交错；
+# False 各进程直接写入日志文件（原来的方式）
+queued_logging = True
+log_queue = setup_logging(log_file, logging.INFO, '%(asctime)s - %(message)s', queued_logging)
+# 成功生成的文件的明细日志：'summary' 每 log_every 个文件汇总为一行；'sample' 每 log_every 个文件记录其中一个；
+# 'full' 每个文件都记录（原来的方式）。出错的文件始终单独记录
+log_detail = 'summary'
+log_every = 1000
 
 # word 模板文件路径
-template_path = "/home/bigyang/python_bigyang/yiheyuan/word/temp.docx"
+template_path = os.path.join(base_dir, 'word', 'temp.docx')
 # JSON 文件夹路径
-json_folder = "/home/bigyang/python_bigyang/yiheyuan/json"
+json_folder = os.path.join(base_dir, 'json')
 # 输出文件夹路径
-output_folder = "/home/bigyang/python_bigyang/yiheyuan/ok"
+output_folder = os.path.join(base_dir, 'ok')
 if not os.path.exists(output_folder):
     os.makedirs(output_folder)
+# 记录库文件路径（excel2json 的 'jsonl' 输出）；设置后从记录库按键读取数据，代替扫描 JSON 文件夹
+record_store_path = None
+
+# 分片运行（见 shard.py）：多台机器各处理一部分数据，按“总登记号”（即 JSON 文件名）的哈希确定性地分配，与 excel2json 的分片一致；
+# 合并模式下按输出文件名分配整组记录。结束后在输出文件夹写入分片清单，用 shard.py 校验所有分片合起来恰好覆盖输入一次。
+# 通过环境变量 YIHEYUAN_SHARD=序号/总数（如 0/4）指定，也可以直接设置为 Shard(0, 4)；未指定时不分片，处理全部数据
+shard = Shard.from_env()
+
+# 输出方式：'files' 每个 Word 文件单独保存到输出文件夹；'archive' 按完成顺序直接写入 ZIP 归档
+output_mode = 'files'
+archive_path = os.path.join(output_folder, shard.file_name('ok.zip'))
+# 每个归档文件的大小上限（字节，不含目录），超过后写入下一个分卷；None 表示不分卷
+archive_max_bytes = None
+
+# 合并模式（邮件合并）：None 每条记录生成一个 Word 文件；字段名（如 '分类号'）按该字段的值分组，
+# 每组合并为一个多节 Word 文件；整数 N 每 N 条记录合并为一个 Word 文件。合并模式始终使用编译模板
+merge_group_by = None
+
+# 增量模式（仅 'files' 输出，且不合并）：根据清单只重新生成数据或模板有变化的文件，并删除已不存在的数据对应的 Word 文件
+incremental = True
+
+# 断点续跑（见 journal.py，仅 'files' 输出）：每完成一个文件在输出文件夹的日志中追加一行，运行中断后重新运行时
+# 跳过已完成且文件完好的输入，只重新生成失败和尚未处理的；全部成功后删除日志。Word 文件都先写临时文件再改名
+resume = True
+# 每完成多少个文件把日志同步到磁盘（fsync）一次
+journal_sync_every = 200
+
+# 是否使用编译模板（每个进程只解析一次模板，逐条记录直接填充占位符）
+use_compiled_template = True
+
+# 所有占位符预编译为一个匹配器（长占位符优先）
+placeholder_matcher = PlaceholderMatcher(PLACEHOLDER_FIELDS)
+
+# 自动调优（见 auto_tune.py）：根据 CPU 核数和可用内存选择进程池或线程池和进程数（每个进程常驻一份模板，进程数受内存限制），
+# 运行中根据实测的内存占用调整同时在途的任务数；False 时只在启动时选择一次
+auto_tune = True
+# 手动设置：None 由自动调优决定，设置后固定使用该值
+executor_type = None  # 'process' 进程池；'thread' 线程池
+max_workers = None  # 进程数
+max_in_flight = None  # 同时在途（已提交未完成）的任务数上限，内存占用只与此窗口有关
+# 每完成多少个文件保存一次清单
+manifest_save_interval = 500
+
+# 每个进程常驻的模板（python-docx 模式）和记录库，由 init_worker 加载一次
+_template_doc = None
+_record_store = None
+
+# 进程初始化：每个进程启动时只加载一次模板和记录库，之后所有任务复用；日志放入主进程的日志队列
+def init_worker(log_queue=None):
+    global _template_doc, _record_store
+    init_worker_logging(log_queue)
+    if use_compiled_template:
+        get_compiled_template(template_path)
+    else:
+        _template_doc = Document(template_path)
+    if record_store_path:
+        _record_store = RecordStore(record_store_path)
+
+# 先写入临时文件（.part）再改名为输出文件，中断时不会留下写了一半的 Word 文件；save(路径) 负责写入
+def save_atomic(save, output_file):
+    tmp_path = f'{output_file}.part'
+    try:
+        save(tmp_path)
+        os.replace(tmp_path, output_file)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
 
 # 定义占位符与 JSON 数据的映射关系
 def map_json_to_placeholders(data):
-    return {
-        "year": data.get("年"),
-        "month": data.get("月"),
-        "day": data.get("日"),
-        "zongdengjihao": data.get("总登记号"),
-        "fenleihao": data.get("分类号"),
-        "name": data.get("名称"),
-        "niandai": data.get("年代"),
-        "jianshu": data.get("件数"),
-        "danwei": data.get("单位"),
-        "chicun": data.get("尺寸"),
-        "zhongliang": data.get("重量"),
-        "zhidi": data.get("质地"),
-        "wancanqingkuang": data.get("完残情况"),
-        "laiyuan": data.get("来源"),
-        "ruguanpingzhenghao": data.get("入馆凭证号"),
-        "zhuxiaopingzhenghao": data.get("注销凭证号"),
-        "jibie": data.get("级别"),
-        "beizhu": data.get("备注"),
-        "fuzeren": data.get("负责人"),
-        "danganbianhao": data.get("档案编号"),
-        "xingzhuangneirongmiaoshu": data.get("形状内容描述"),
-        "dangqianbaocuntiaojian": data.get("当前保存条件"),
-        "mingjitiba": data.get("铭记题跋")
-    }
+    return {key: data.get(field) for key, field in PLACEHOLDER_FIELDS.items()}
+
+# 根据一条记录生成 Word 文件；归档模式下不写文件，返回 (归档内文件名, 文件内容) 交给主进程写入归档
+def render_record(name, data):
+    # 空值的占位符保持原样
+    placeholders = {key: value for key, value in map_json_to_placeholders(data).items() if value}
+    output_file = os.path.join(output_folder, f'{name}.docx')
+
+    if use_compiled_template:
+        with timer.stage('template_load'):
+            template = get_compiled_template(template_path)
+        if output_mode == 'archive':
+            with timer.stage('render'):
+                return f'{name}.docx', template.render_bytes(placeholders)
+        with timer.stage('fill'):
+            document_xml = template.render_document_xml(placeholders)
+        with timer.stage('save'):
+            save_atomic(partial(template.save_document_xml, document_xml), output_file)
+    else:
+        # 复制常驻的 Word 模板，无需重新解析模板文件
+        with timer.stage('template_load'):
+            doc = copy.deepcopy(_template_doc) if _template_doc is not None else Document(template_path)
+
+        # 一次扫描替换段落和表格中的所有占位符
+        with timer.stage('fill'):
+            fill_document(doc, placeholders, placeholder_matcher)
+
+        if output_mode == 'archive':
+            with timer.stage('save'):
+                buffer = io.BytesIO()
+                doc.save(buffer)
+            return f'{name}.docx', buffer.getvalue()
+
+        # 保存生成的 Word 文件
+        with timer.stage('save'):
+            save_atomic(doc.save, output_file)
+    # 成功的文件由主进程汇总记录日志（见 log_detail）
+    return True
 
 # 处理单个 JSON 文件
 def process_single_file(json_file):
     try:
         # 读取 JSON 数据
-        with open(json_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-
-        # 读取 Word 模板
-        doc = Document(template_path)
-        placeholders = map_json_to_placeholders(data)
-
-        # 替换占位符
-        for p in doc.paragraphs:
-            for key, value in placeholders.items():
-                if value:
-                    p.text = p.text.replace(f'{key}', str(value))
-
-        # 处理表格中的占位符
-        for table in doc.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    for key, value in placeholders.items():
-                        if value:
-                            cell.text = cell.text.replace(f'{key}', str(value))
+        with timer.stage('json_load'):
+            data = json_codec.load(json_file)
 
-        # 保存生成的 Word 文件
-        output_file = os.path.join(output_folder, os.path.basename(json_file).replace('.json', '.docx'))
-        doc.save(output_file)
+        return render_record(os.path.splitext(os.path.basename(json_file))[0], data)
+    except Exception as e:
+        logging.error(f"处理文件 {json_file} 时出错: {str(e)}")
+        return False
 
-        logging.info(f'成功生成文件: {output_file}')
+# 按键处理记录库中的单条记录
+def process_store_record(key):
+    try:
+        with timer.stage('json_load'):
+            data = _record_store.get(key)
+        return render_record(key, data)
+    except Exception as e:
+        logging.error(f"处理记录 {key} 时出错: {str(e)}")
+        return False
+
+# 读取一条输入的数据（JSON 文件路径或记录库中的键）
+def load_input(item):
+    if _record_store is not None:
+        return _record_store.get(item)
+    return json_codec.load(item)
+
+# 输入对应的名称（JSON 文件名或记录库中的键）
+def input_name(item):
+    return item if record_store_path else os.path.splitext(os.path.basename(item))[0]
+
+# 任务对应的输出文件名（不含扩展名）：合并模式下为组名，否则为输入的名称
+def output_name(item):
+    return item[0] if merge_group_by else input_name(item)
+
+# 处理一组记录：依次填入模板并合并为一个 Word 文件，记录之间分节（下一页）
+def process_group(group):
+    name, items = group
+    try:
+        template = get_compiled_template(template_path)
+        # 空值的占位符保持原样
+        with timer.stage('json_load', len(items)):
+            mappings = [{key: value for key, value in map_json_to_placeholders(load_input(item)).items() if value}
+                        for item in items]
+        if output_mode == 'archive':
+            with timer.stage('render_merged', len(items)):
+                return f'{name}.docx', template.render_merged_bytes(mappings)
+        output_file = os.path.join(output_folder, f'{name}.docx')
+        with timer.stage('render_merged', len(items)):
+            save_atomic(partial(template.save_merged, mappings), output_file)
         return True
     except Exception as e:
-        logging.error(f"处理文件 {json_file} 时出错: {str(e)}")
+        logging.error(f"处理合并文件 {name} 时出错: {str(e)}")
         return False
 
-# 批量处理函数
-def batch_process_json_files(json_files, batch_num, total_batches):
-    total_files = len(json_files)
-    with ProcessPoolExecutor(max_workers=cpu_count()) as executor:
-        futures = [executor.submit(process_single_file, json_file) for json_file in json_files]
-        
+# 按合并方式把输入分组，返回 [(输出文件名, [输入, ...]), ...]
+def build_groups(json_files):
+    if isinstance(merge_group_by, int):
+        batches = [json_files[i:i + merge_group_by] for i in range(0, len(json_files), merge_group_by)]
+        return [(f'{input_name(batch[0])}_{input_name(batch[-1])}', batch) for batch in batches]
+
+    # 按字段值分组，保持输入顺序
+    if record_store_path:
+        with RecordStore(record_store_path) as store:
+            values = {key: record.get(merge_group_by) for key, record in store}
+    else:
+        values = {}
+        for json_file in json_files:
+            values[json_file] = json_codec.load(json_file).get(merge_group_by)
+    groups = {}
+    for item in json_files:
+        value = values[item]
+        # 字段缺失或为空（Excel 空单元格导出为 'nan'）的记录归为一组，文件名为“无字段名”
+        key = None if value is None or str(value).strip() in ('', 'nan') else str(value)
+        groups.setdefault(key, []).append(item)
+
+    result, used = [], set()
+    for value, items in groups.items():
+        # 清理文件名中的非法字符；清理后与其他组同名时（如 A/1 与 A1）加序号，避免互相覆盖
+        base = f'无{merge_group_by}' if value is None else (re.sub(r'[^\w\s-]', '', value).strip() or 'empty')
+        name, n = base, 1
+        while name in used:
+            n += 1
+            name = f'{base}_{n}'
+        used.add(name)
+        result.append((name, items))
+    return result
+
+# 使用常驻进程池处理所有文件：进程只创建一次，任务完成一个补充一个，不在批次之间等待；按完成顺序返回 (输入, 处理结果)
+def process_files(json_files, worker=process_single_file):
+    # 每个任务处理一个文件
+    tuner = AutoTuner('render', executor_type, max_workers, 1, max_in_flight, auto_tune)
+    print(f"自动调优：{tuner.describe()}")
+    with tuner.make_executor(initializer=init_worker, initargs=(log_queue,)) as executor:
         # 使用 rich 进度条显示
         with Progress(
             TextColumn("[bold blue]{task.description}"),
@@ -102,10 +259,20 @@ def batch_process_json_files(json_files, batch_num, total_batches):
             "[progress.percentage]{task.percentage:>3.1f}%",
             TimeRemainingColumn(),
         ) as progress:
-            task = progress.add_task(f"第 {batch_num}/{total_batches} 批文件处理进度", total=total_files)
+            task = progress.add_task("文件处理进度", total=len(json_files))
+
+            if timer.enabled and tuner.executor == 'process':
+                # 子进程的各阶段耗时随结果一起返回，在主进程中汇总
+                for json_file, (result, stats) in bounded_map(executor, partial(call_with_timing, worker), json_files, tuner.window):
+                    timer.merge(stats)
+                    tuner.record(1)
+                    yield json_file, result
+                    progress.update(task, advance=1)
+                return
 
-            for future in as_completed(futures):
-                future.result()  # 阻塞，确保每个任务完成
+            for json_file, result in bounded_map(executor, worker, json_files, tuner.window):
+                tuner.record(1)
+                yield json_file, result
                 progress.update(task, advance=1)
 
 # 获取所有 JSON 文件并按文件名排序
@@ -113,22 +280,169 @@ def get_sorted_json_files(json_folder):
     json_files = [os.path.join(json_folder, f) for f in os.listdir(json_folder) if f.endswith('.json')]
     return sorted(json_files, key=lambda x: os.path.basename(x))  # 按文件名排序
 
+# 获取记录库中所有记录的键并排序
+def get_sorted_record_keys(store_path):
+    with RecordStore(store_path) as store:
+        return sorted(store.keys())
+
+# 断点续跑日志中每个任务的内容哈希 {输出文件名: 哈希}，用来判断上次完成之后输入是否有变化：
+# 增量模式下取清单计算的哈希；否则 JSON 文件和记录库中的记录都按解析后的数据计算；
+# 合并模式下为组内各记录的名称及其哈希（按名称排序）合起来的哈希，组成员或任一记录变化时都不同
+def task_hashes(todo, manifest=None, changed=None):
+    if manifest is not None:
+        return {output_name(item): changed[item][1] for item in todo}
+    items = [item for _, group in todo for item in group] if merge_group_by else todo
+    if record_store_path:
+        with RecordStore(record_store_path) as store:
+            hashes = {key: record_hash(store.get(key)) for key in items}
+    else:
+        hashes = {item: json_file_hash(item) for item in items}
+    if not merge_group_by:
+        return {input_name(item): hashes[item] for item in items}
+    return {name: record_hash(sorted([input_name(item), hashes[item]] for item in group)) for name, group in todo}
+
+# 按清单筛选需要重新生成的数据，返回 {输入: (键, 内容哈希, 文件状态, 输出文件)}
+def select_changed(manifest, json_files):
+    changed = {}
+    if record_store_path:
+        with RecordStore(record_store_path) as store:
+            hashes = {key: record_hash(record) for key, record in store}
+        for key in json_files:
+            output_file = os.path.join(output_folder, f'{key}.docx')
+            if not manifest.is_current(key, hashes[key], output_file):
+                changed[key] = (key, hashes[key], None, output_file)
+    else:
+        for json_file in json_files:
+            key = os.path.splitext(os.path.basename(json_file))[0]
+            output_file = os.path.join(output_folder, f'{key}.docx')
+            # 按解析后的数据计算哈希：切换 JSON 后端或紧凑格式后重新导出的 JSON 文件，内容不变时不会重新生成
+            current, content_hash, stat = manifest.is_file_current(key, json_file, output_file, json_file_hash)
+            if not current:
+                changed[json_file] = (key, content_hash, stat, output_file)
+    return changed
+
 if __name__ == "__main__":
-    json_files = get_sorted_json_files(json_folder)
+    if record_store_path:
+        json_files, worker = get_sorted_record_keys(record_store_path), process_store_record
+    else:
+        json_files, worker = get_sorted_json_files(json_folder), process_single_file
+    if shard.enabled and not merge_group_by:
+        print(f"分片运行：{shard}")
+        json_files = shard.select_keys(json_files, input_name)
     
     if not json_files:
         logging.error("没有找到 JSON 文件")
         print("错误: 没有找到任何 JSON 文件。")
     else:
-        # 计算总批次数量
-        batch_size = 500
-        total_batches = (len(json_files) + batch_size - 1) // batch_size  # 总批数,向上取整
+        manifest, changed = None, None
+        if merge_group_by:
+            # 合并模式：每组记录生成一个 Word 文件
+            todo, worker = build_groups(json_files), process_group
+            print(f"共 {len(json_files)} 条数据，合并为 {len(todo)} 个 Word 文件。")
+            if shard.enabled:
+                # 先按全部数据分组再分片，同一组的记录不会被拆到不同的分片
+                todo = shard.select_keys(todo, lambda group: group[0])
+                print(f"分片运行：{shard}，本分片生成 {len(todo)} 个 Word 文件。")
+        elif incremental and output_mode == 'files':
+            # 分片运行时每个分片使用各自的清单，只管理本分片的文件
+            manifest = Manifest(output_folder, file_hash(template_path), shard.file_name(MANIFEST_NAME))
+            changed = select_changed(manifest, json_files)
+            print(f"共 {len(json_files)} 条数据，其中 {len(changed)} 条有变化需要重新生成。")
+            todo = [json_file for json_file in json_files if json_file in changed]
+        else:
+            todo = json_files
+
+        # 分片清单包含本分片的全部输入（增量模式下未变化、续跑时已完成而跳过的也算在内）
+        # 合并模式下清单记录每组包含的记录，校验时按记录核对输入、按组名核对输出文件
+        if merge_group_by:
+            shard_groups = {name: [input_name(item) for item in items] for name, items in todo}
+            shard_keys = [key for keys in shard_groups.values() for key in keys]
+        else:
+            shard_groups, shard_keys = None, [input_name(item) for item in json_files]
+
+        journal = None
+        if resume and output_mode == 'files':
+            journal = Journal(os.path.join(output_folder, shard.file_name(JOURNAL_NAME)), file_hash(template_path),
+                              journal_sync_every)
+            hashes = task_hashes(todo, manifest, changed)
+            if journal.resumed:
+                # 上次运行中断：跳过已完成的，增量模式下已完成的同时补记到清单（内容有变化的仍重新生成）
+                remaining = []
+                for item in todo:
+                    name = output_name(item)
+                    if journal.is_done(name, os.path.join(output_folder, f'{name}.docx'), hashes[name]):
+                        if manifest is not None:
+                            key, content_hash, stat, output_file = changed[item]
+                            manifest.update(key, content_hash, output_file, stat)
+                    else:
+                        remaining.append(item)
+                retried = len(set(journal.failed_keys()) & {output_name(item) for item in remaining})
+                print(f"从上次中断处继续：跳过 {len(todo) - len(remaining)} 个已完成的文件，"
+                      f"剩余 {len(remaining)} 个（其中 {retried} 个上次失败）。")
+                todo = remaining
+
+        archive = ArchiveWriter(archive_path, archive_max_bytes) if output_mode == 'archive' else None
+        record_log = RecordLog(log_detail, log_every, '成功生成 %d 个文件，累计 %d 个')
+        failed = []
+
+        try:
+            for done, (json_file, result) in enumerate(process_files(todo, worker), 1):
+                succeeded = bool(result)
+                timer.count('succeeded' if succeeded else 'failed')
+                if journal is not None:
+                    journal.record(output_name(json_file), succeeded, hashes[output_name(json_file)])
+                if not succeeded:
+                    failed.append(output_name(json_file))
+                if result is True:
+                    if merge_group_by:
+                        name, items = json_file
+                        record_log.add('成功生成合并文件: %s（%d 条记录）', os.path.join(output_folder, f'{name}.docx'), len(items))
+                    else:
+                        record_log.add('成功生成文件: %s', os.path.join(output_folder, f'{input_name(json_file)}.docx'))
+                if archive is not None and succeeded:
+                    # 顺序写入归档
+                    with timer.stage('archive_write'):
+                        archive.add(*result)
+                if manifest is not None:
+                    # 成功的写入清单，失败的下次重新生成
+                    key, content_hash, stat, output_file = changed[json_file]
+                    if succeeded:
+                        manifest.update(key, content_hash, output_file, stat)
+                    else:
+                        manifest.discard(key)
+                    if done % manifest_save_interval == 0:
+                        manifest.save()
+        finally:
+            if journal is not None:
+                journal.close()
+        if journal is not None:
+            if failed:
+                print(f"{len(failed)} 个文件生成失败，重新运行时只重试这些文件。")
+            else:
+                # 全部成功，下次运行从头开始
+                journal.remove()
+
+        record_log.close()
+        if archive is not None:
+            archive.close()
+            print(f"已将 {archive.count} 个 Word 文件写入归档: {', '.join(archive.paths)}")
+
+        if manifest is not None:
+            # 删除已不存在的数据对应的 Word 文件
+            removed = manifest.remove_stale()
+            manifest.save()
+            if removed:
+                print(f"已删除 {len(removed)} 个过期的 Word 文件。")
 
-        # 分批处理
-        for i in range(0, len(json_files), batch_size):
-            batch_num = (i // batch_size) + 1  # 当前批次
-            batch = json_files[i:i + batch_size]
-            batch_process_json_files(batch, batch_num, total_batches)
+        if shard.enabled:
+            shard_file = write_shard_file(output_folder, shard, 'json2word', shard_keys, failed,
+                                          '.docx' if output_mode == 'files' else None, shard_groups)
+            print(f"分片清单已保存到 {shard_file}。")
 
-        print(f"程序运行完毕，共处理 {len(json_files)} 个文件，请查看生成的 Word 文件。")
+        print(f"程序运行完毕，共处理 {len(todo)} 个文件，请查看生成的 Word 文件。")
 
+        # 开启计时（YIHEYUAN_TIMING=1）时输出各阶段耗时汇总，与日志文件放在一起
+        timing_file = timer.save(log_dir, 'json2word_multi')
+        if timing_file:
+            print(timer.report())
+            print(f"各阶段耗时汇总已保存到 {timing_file}")
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# 队列日志：调用 logging 时只把日志记录放入队列，由主进程中的一个后台线程（QueueListener）格式化并写入日志文件，
+# 生成 Word 的热路径上不再同步写文件；多进程运行时子进程的日志也放入同一个队列，由这一个线程写入，各进程的日志行不会交错。
+# 逐条记录的明细日志（如每生成一个文件一行）可以用 RecordLog 汇总为每 N 条一行，或每 N 条抽样一条
+
+import os
+import atexit
+import logging
+import logging.handlers
+import multiprocessing
+
+# 明细日志方式：'summary' 每 N 条汇总为一行；'sample' 每 N 条记录其中一条的明细；'full' 每条都记录明细
+DETAIL_MODES = ('summary', 'sample', 'full')
+
+# 主进程中的日志队列和写日志的后台线程，由 setup_logging 创建
+_queue = None
+_listener = None
+_owner_pid = None
+
+
+# 函数：设置日志。queued=True 时使用队列日志，返回日志队列（多进程时传给 init_worker_logging）；
+# queued=False 时与原来一样由 logging.basicConfig 直接写入日志文件，返回 None。
+# 队列日志在子进程中（spawn 方式启动的进程会重新导入脚本）不做任何设置，子进程的日志由 init_worker_logging 转到主进程
+def setup_logging(log_file, level=logging.INFO, fmt='%(asctime)s - %(message)s', queued=True):
+    global _queue, _listener, _owner_pid
+    if not queued:
+        logging.basicConfig(filename=log_file, level=level, format=fmt)
+        return None
+    if multiprocessing.parent_process() is not None:
+        return None
+
+    handler = logging.FileHandler(log_file)
+    handler.setFormatter(logging.Formatter(fmt))
+    # multiprocessing.Queue 可以传给进程池的子进程；put 只是放入缓冲区，由队列的后台线程负责传输
+    _queue = multiprocessing.Queue(-1)
+    _listener = logging.handlers.QueueListener(_queue, handler)
+    _listener.start()
+    _owner_pid = os.getpid()
+    _install(_queue, level)
+    # 程序退出时写完队列中剩余的日志
+    atexit.register(stop_logging)
+    return _queue
+
+
+# 函数：进程池的初始化函数：子进程的日志放入主进程的日志队列；log_queue 为 None（直接写日志文件的方式）时不做处理
+def init_worker_logging(log_queue, level=logging.INFO):
+    if log_queue is not None:
+        _install(log_queue, level)
+
+
+# 函数：根日志器只保留一个写入队列的处理器
+def _install(log_queue, level):
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level)
+
+
+# 函数：写完队列中剩余的日志并停止后台线程（可重复调用，只在创建队列的主进程中生效）
+def stop_logging():
+    global _listener
+    if _listener is None or os.getpid() != _owner_pid:
+        return
+    listener, _listener = _listener, None
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+
+
+class RecordLog:
+    # 逐条记录的明细日志：detail 为 DETAIL_MODES 之一，every 为汇总或抽样的间隔条数；
+    # summary 为汇总行的格式（%d 依次为本段条数和累计条数），在 'summary' 方式下每 every 条写一行，close 时写出剩余部分
+    def __init__(self, detail='summary', every=1000, summary='已处理 %d 条，累计 %d 条', logger=logging):
+        if detail not in DETAIL_MODES:
+            raise ValueError(f"不支持的明细日志方式：{detail}，可选 {', '.join(DETAIL_MODES)}")
+        self.detail = detail
+        self.every = max(1, every)
+        self.summary = summary
+        self.logger = logger
+        self.total = 0
+        self._pending = 0
+
+    # 函数：记录一条；msg 和 args 与 logging.info 相同，只有需要写明细时才格式化
+    def add(self, msg=None, *args):
+        self.total += 1
+        if self.detail == 'full' or (self.detail == 'sample' and self.total % self.every == 1 % self.every):
+            if msg is not None:
+                self.logger.info(msg, *args)
+        elif self.detail == 'summary':
+            self._pending += 1
+            if self._pending >= self.every:
+                self._flush()
+
+    # 函数：写出尚未汇总的部分
+    def close(self):
+        if self._pending:
+            self._flush()
+
+    def _flush(self):
+        self.logger.info(self.summary, self._pending, self.total)
+        self._pending = 0
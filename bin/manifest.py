@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# 增量清单：记录每条数据的内容哈希、模板哈希和输出文件，重新运行时只处理有变化的记录
+
+import os
+import json
+import hashlib
+
+import json_codec
+
+# 清单文件名（保存在输出目录中）
+MANIFEST_NAME = '.manifest'  # 不使用 .json 后缀，避免被当作数据文件读取
+
+
+# 函数：计算一条记录（字典）的内容哈希，与键的顺序无关
+def record_hash(record):
+    data = json.dumps(record, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
+# 函数：计算文件内容哈希
+def file_hash(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+# 函数：计算 JSON 文件的内容哈希：按解析后的数据计算（与 record_hash 相同），与缩进、空格和写入时使用的 JSON 后端无关；
+# 无法解析的文件按文件内容计算
+def json_file_hash(path):
+    try:
+        return record_hash(json_codec.load(path))
+    except ValueError:
+        return file_hash(path)
+
+
+# 函数：文件的大小和修改时间，未变化时无需重新计算哈希
+def file_stat(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class Manifest:
+    def __init__(self, output_dir, template_hash='', name=MANIFEST_NAME):
+        # name 为清单文件名；多个数据源写入同一个目录时（如多个工作表），各自使用不同的清单
+        self.path = os.path.join(output_dir, name)
+        self.template_hash = template_hash
+        self.entries = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except ValueError:
+                # 清单损坏时当作首次运行处理
+                self.entries = {}
+        self.seen = set()
+
+    # 函数：判断记录是否无需重新处理（内容、模板都未变化且输出文件仍然存在）
+    def is_current(self, key, content_hash, output_path):
+        self.seen.add(key)
+        entry = self.entries.get(key)
+        return (entry is not None
+                and entry['hash'] == content_hash
+                and entry['template'] == self.template_hash
+                and entry['output'] == output_path
+                and os.path.exists(output_path))
+
+    # 函数：按输入文件判断是否需要重新处理；hash_file 为计算文件内容哈希的函数；文件大小和修改时间都未变时跳过哈希计算
+    def is_file_current(self, key, input_path, output_path, hash_file=file_hash):
+        entry = self.entries.get(key)
+        stat = file_stat(input_path)
+        if entry is not None and entry.get('stat') == stat:
+            content_hash = entry['hash']
+        else:
+            content_hash = hash_file(input_path)
+        return self.is_current(key, content_hash, output_path), content_hash, stat
+
+    # 函数：记录处理成功的数据
+    def update(self, key, content_hash, output_path, stat=None):
+        self.seen.add(key)
+        entry = {'hash': content_hash, 'template': self.template_hash, 'output': output_path}
+        if stat is not None:
+            entry['stat'] = stat
+        self.entries[key] = entry
+
+    # 函数：从 [(键, 记录), ...] 中筛选出需要重新输出的记录，并更新清单
+    def filter_changed(self, records, output_path):
+        changed = []
+        for key, record in records:
+            content_hash = record_hash(record)
+            path = output_path(key)
+            if not self.is_current(key, content_hash, path):
+                self.update(key, content_hash, path)
+                changed.append((key, record))
+        return changed
+
+    # 函数：处理失败的数据从清单中移除，下次运行时重新处理
+    def discard(self, key):
+        self.entries.pop(key, None)
+
+    # 函数：删除本次运行中已不存在的数据对应的输出文件，返回被删除的键
+    def remove_stale(self):
+        stale = [key for key in self.entries if key not in self.seen]
+        for key in stale:
+            output_path = self.entries.pop(key)['output']
+            if os.path.exists(output_path):
+                os.remove(output_path)
+        return stale
+
+    # 函数：保存清单（先写临时文件再替换，避免清单不完整）
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
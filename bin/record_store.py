@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# 记录库：所有记录追加写入一个 JSON Lines 文件，并维护 键 -> 偏移量 的索引，
+# 代替每行一个 JSON 文件的输出方式
+
+import os
+import json
+import threading
+import json_codec
+
+# 索引文件后缀
+INDEX_SUFFIX = '.idx'
+
+
+# 函数：索引文件路径
+def index_path(store_path):
+    return store_path + INDEX_SUFFIX
+
+
+# 函数：序列化一条记录（每条记录占一行）
+def _encode_line(key, record):
+    return json_codec.dumps({"key": key, "record": record}, compact=True) + b"\n"
+
+
+class RecordStoreWriter:
+    def __init__(self, store_path, append=False):
+        self.store_path = store_path
+        os.makedirs(os.path.dirname(os.path.abspath(store_path)), exist_ok=True)
+        self.index = {}
+        if append and os.path.exists(store_path):
+            # 追加模式：沿用已有记录的索引，并截掉上次中断时写了一半的记录
+            self.index = load_index(store_path)
+            self._file = open(store_path, 'r+b')
+            self._file.truncate(max((offset + length for offset, length in self.index.values()), default=0))
+        else:
+            self._file = open(store_path, 'wb')
+        self._offset = self._file.seek(0, os.SEEK_END)
+
+    # 函数：追加一条记录；同一个键多次写入时以最后一次为准
+    def write(self, key, record):
+        line = _encode_line(key, record)
+        self._file.write(line)
+        self.index[key] = (self._offset, len(line))
+        self._offset += len(line)
+
+    def write_many(self, records):
+        for key, record in records:
+            self.write(key, record)
+
+    # 函数：关闭记录库并写出索引（先写临时文件再替换，避免索引不完整）
+    def close(self):
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        tmp_path = index_path(self.store_path) + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.index, f, ensure_ascii=False)
+        os.replace(tmp_path, index_path(self.store_path))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# 函数：读取索引；索引缺失或比记录库旧时（如写入中断）重新扫描记录库生成索引
+def load_index(store_path):
+    idx_path = index_path(store_path)
+    if os.path.exists(idx_path) and os.path.getmtime(idx_path) >= os.path.getmtime(store_path):
+        with open(idx_path, 'r', encoding='utf-8') as f:
+            return {key: tuple(value) for key, value in json.load(f).items()}
+
+    index, offset = {}, 0
+    with open(store_path, 'rb') as f:
+        for line in f:
+            # 忽略末尾写了一半的记录
+            if not line.endswith(b"\n"):
+                break
+            index[json_codec.loads(line)["key"]] = (offset, len(line))
+            offset += len(line)
+    return index
+
+
+class RecordStore:
+    def __init__(self, store_path):
+        self.store_path = store_path
+        self.index = load_index(store_path)
+        self._file = open(store_path, 'rb')
+        # 没有 os.pread 的系统上 seek 和 read 需要加锁（线程池中多个线程共用一个记录库）
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def keys(self):
+        return self.index.keys()
+
+    # 函数：按键读取一条记录（可在多个线程中同时调用：按偏移量读取，不改变共用的文件位置）
+    def get(self, key):
+        offset, length = self.index[key]
+        if hasattr(os, 'pread'):
+            data = os.pread(self._file.fileno(), length, offset)
+        else:
+            with self._lock:
+                self._file.seek(offset)
+                data = self._file.read(length)
+        return json_codec.loads(data)["record"]
+
+    # 函数：顺序流式读取所有记录 (键, 记录)，跳过被后写入的同键记录覆盖的旧记录
+    def __iter__(self):
+        live = {offset for offset, _ in self.index.values()}
+        offset = 0
+        with open(self.store_path, 'rb') as f:
+            for line in f:
+                if offset in live:
+                    item = json_codec.loads(line)
+                    yield item["key"], item["record"]
+                offset += len(line)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# 函数：判断路径是否为记录库文件
+def is_record_store(path):
+    return os.path.isfile(path) and path.endswith('.jsonl')
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# 有界调度：同时在途的任务数不超过设定的窗口，任务完成一个再提交一个，
+# 内存占用只与窗口大小有关，与输入数据量无关
+
+import asyncio
+from concurrent.futures import wait, FIRST_COMPLETED
+
+
+# 函数：窗口大小；max_in_flight 可以是整数，也可以是返回当前窗口大小的函数（自动调优时窗口随运行情况变化）
+def _limit(max_in_flight):
+    return max_in_flight() if callable(max_in_flight) else max_in_flight
+
+
+# 函数：向执行器（线程池/进程池）提交任务，最多 max_in_flight 个同时在途，按完成顺序返回 (输入, 结果)
+def bounded_map(executor, fn, items, max_in_flight):
+    items = iter(items)
+    pending = {}
+
+    # 函数：从输入中补充任务，直到窗口填满或输入耗尽
+    def fill():
+        while len(pending) < _limit(max_in_flight):
+            try:
+                item = next(items)
+            except StopIteration:
+                return
+            pending[executor.submit(fn, item)] = item
+
+    fill()
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            item = pending.pop(future)
+            yield item, future.result()
+        fill()
+
+
+# 函数：异步版本，对每个输入调用 func(item) 得到协程并执行，最多 max_in_flight 个同时在途；任一任务出错时抛出异常
+async def run_bounded(func, items, max_in_flight):
+    pending = set()
+    try:
+        for item in items:
+            while len(pending) >= _limit(max_in_flight):
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    task.result()
+            pending.add(asyncio.ensure_future(func(item)))
+        if pending:
+            done, pending = await asyncio.wait(pending)
+            for task in done:
+                task.result()
+    finally:
+        # 出错时取消尚未完成的任务
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# 确定性分片：把一次任务拆给多台机器（或同一台机器上的多个进程）分别运行，不需要任何协调服务。
+# 每条记录按键（即“总登记号”清理后的文件名，总登记号为空时为 row_行号）的稳定哈希分到 N 个分片之一，
+# 同一条记录无论在哪台机器、第几次运行、Excel 转 JSON 还是 JSON 转 Word 阶段，都分到同一个分片。
+# 每个分片运行结束后在输出目录写入分片清单（.shard_序号of总数），记录分到的所有键和失败的键；
+# 合并/校验步骤读取所有分片清单，检查所有分片合起来恰好覆盖输入的每条记录一次，并可把各分片的输出合并到一个目录
+#
+# 用法示例：
+#   YIHEYUAN_SHARD=0/4 python excel2json_multi.py        # 4 个分片中的第 1 个（序号从 0 开始）
+#   python shard.py --input ../excel/source.xlsx /data/json_0 /data/json_1 /data/json_2 /data/json_3
+#   python shard.py --input /data/json --merge-into /data/ok /data/ok_0 /data/ok_1
+
+import os
+import sys
+import json
+import zlib
+import shutil
+import argparse
+
+from excel_reader import ExcelChunkReader, KEY_COLUMN, chunk_to_records
+from record_store import RecordStore, is_record_store
+
+# 指定分片的环境变量，格式为 “序号/总数”，如 0/4
+SHARD_ENV = 'YIHEYUAN_SHARD'
+# 分片清单文件名的前缀（保存在输出目录中，不使用 .json 后缀，避免被当作数据文件读取）
+SHARD_FILE_PREFIX = '.shard_'
+
+
+# 函数：记录键所属的分片序号；使用 CRC32 而不是 hash()，不同机器、不同 Python 进程的结果都相同
+def shard_of(key, count):
+    return zlib.crc32(str(key).encode('utf-8')) % count
+
+
+class Shard:
+    # index 为分片序号（从 0 开始），count 为分片总数；count 为 1 时不分片，处理全部数据
+    def __init__(self, index=0, count=1):
+        if count < 1 or not 0 <= index < count:
+            raise ValueError(f"分片设置无效：{index}/{count}，序号应在 0 到 {count - 1} 之间")
+        self.index = index
+        self.count = count
+
+    # 函数：从环境变量 YIHEYUAN_SHARD（如 0/4）读取分片设置，未设置时不分片
+    @classmethod
+    def from_env(cls):
+        value = os.environ.get(SHARD_ENV, '').strip()
+        if not value:
+            return cls()
+        try:
+            index, count = (int(part) for part in value.split('/'))
+        except ValueError:
+            raise ValueError(f"环境变量 {SHARD_ENV} 的格式应为 序号/总数，如 0/4，实际为 {value!r}")
+        return cls(index, count)
+
+    @property
+    def enabled(self):
+        return self.count > 1
+
+    def __contains__(self, key):
+        return self.count == 1 or shard_of(key, self.count) == self.index
+
+    # 函数：只保留本分片的记录 [(键, 数据), ...]
+    def select(self, records):
+        if not self.enabled:
+            return records
+        return [record for record in records if record[0] in self]
+
+    # 函数：只保留本分片的键（或 key 函数取得的键），保持原有顺序
+    def select_keys(self, items, key=None):
+        if not self.enabled:
+            return list(items)
+        return [item for item in items if (key(item) if key else item) in self]
+
+    # 函数：分片运行时在文件名（清单、记录库、归档等每个分片各自一份的文件）后加上分片标记，不分片时不变
+    def file_name(self, name):
+        if not self.enabled:
+            return name
+        root, ext = os.path.splitext(name)
+        return f'{root}_{self.index}of{self.count}{ext}'
+
+    def __str__(self):
+        return f'第 {self.index + 1} / {self.count} 个分片（{SHARD_ENV}={self.index}/{self.count}）'
+
+
+# 函数：分片运行结束后写入分片清单：stage 为阶段名称，keys 为分到本分片的所有键，failed 为处理失败的键（或输出文件名），
+# ext 为输出文件的扩展名（每个输出一个文件时，如 '.json'、'.docx'；输出为记录库或归档时为 None）；
+# groups 为合并模式下的 {输出文件名: [键, ...]}，此时按输出文件名分片，keys 为各组包含的所有键
+def write_shard_file(output_dir, shard, stage, keys, failed=(), ext=None, groups=None):
+    path = os.path.join(output_dir, f'{SHARD_FILE_PREFIX}{shard.index}of{shard.count}')
+    data = {'stage': stage, 'index': shard.index, 'count': shard.count, 'ext': ext,
+            'keys': sorted(set(keys)), 'failed': sorted(set(failed))}
+    if groups is not None:
+        data['groups'] = groups
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+# 函数：分片清单对应的输出文件名（不含扩展名）：合并模式下为各组的名称，否则为各个键
+def _outputs(data):
+    return list(data['groups']) if data.get('groups') is not None else data['keys']
+
+
+# 函数：读取目录中的所有分片清单，返回 [(清单所在目录, 清单内容), ...]
+def read_shard_files(directory):
+    found = []
+    for name in sorted(os.listdir(directory)):
+        if name.startswith(SHARD_FILE_PREFIX) and not name.endswith('.tmp'):
+            with open(os.path.join(directory, name), 'r', encoding='utf-8') as f:
+                found.append((directory, json.load(f)))
+    return found
+
+
+# 函数：读取输入中所有记录的键：Excel 文件（只读取“总登记号”列）、JSON 文件夹或 records.jsonl 记录库
+def input_keys(path, chunk_size=5000):
+    if is_record_store(path):
+        with RecordStore(path) as store:
+            return list(store.keys())
+    if os.path.isdir(path):
+        return [os.path.splitext(name)[0] for name in os.listdir(path) if name.endswith('.json')]
+    keys = []
+    with ExcelChunkReader(path, chunk_size, columns=[KEY_COLUMN]) as reader:
+        for chunk in reader:
+            keys.extend(key for key, _ in chunk_to_records(chunk))
+    return keys
+
+
+# 函数：校验所有分片合起来恰好覆盖输入一次，返回问题列表（为空表示校验通过）。
+# 检查：分片总数一致且每个分片都有清单；每个键只属于一个分片；每个键（合并模式下为每组）分在正确的分片；
+# 没有遗漏和多余的键；没有处理失败的键；每个输出一个文件时，输出文件存在
+def verify(keys, shard_files):
+    problems = []
+    if not shard_files:
+        return ['没有找到任何分片清单']
+    counts = {data['count'] for _, data in shard_files}
+    if len(counts) > 1:
+        return [f"各分片的分片总数不一致：{sorted(counts)}"]
+    count = counts.pop()
+    indexes = [data['index'] for _, data in shard_files]
+    missing_shards = sorted(set(range(count)) - set(indexes))
+    if missing_shards:
+        problems.append(f"缺少分片：{', '.join(str(i) for i in missing_shards)}（共 {count} 个）")
+    duplicated_shards = sorted({i for i in indexes if indexes.count(i) > 1})
+    if duplicated_shards:
+        problems.append(f"分片重复出现：{', '.join(str(i) for i in duplicated_shards)}")
+
+    owner = {}
+    for directory, data in shard_files:
+        for key in data['keys']:
+            if key in owner and owner[key] != data['index']:
+                problems.append(f"记录 {key} 同时出现在分片 {owner[key]} 和 {data['index']} 中")
+            owner.setdefault(key, data['index'])
+        for name in _outputs(data):
+            if shard_of(name, count) != data['index']:
+                problems.append(f"{name} 应属于分片 {shard_of(name, count)}，却出现在分片 {data['index']} 中")
+            if data['ext'] and not os.path.exists(os.path.join(directory, f"{name}{data['ext']}")):
+                problems.append(f"分片 {data['index']} 缺少输出文件 {name}{data['ext']}")
+        for key in data['failed']:
+            problems.append(f"分片 {data['index']} 中记录 {key} 处理失败")
+
+    expected = set(keys)
+    for key in sorted(expected - set(owner)):
+        problems.append(f"记录 {key} 不在任何分片中")
+    for key in sorted(set(owner) - expected):
+        problems.append(f"记录 {key} 不在输入中")
+    return problems
+
+
+# 函数：把各分片目录中的输出文件（及分片清单）复制到同一个目录，返回复制的文件数
+def merge(shard_files, target_dir):
+    os.makedirs(target_dir, exist_ok=True)
+    copied = 0
+    for directory, data in shard_files:
+        if os.path.abspath(directory) == os.path.abspath(target_dir):
+            continue
+        names = [f"{name}{data['ext']}" for name in _outputs(data)] if data['ext'] else []
+        names.append(f"{SHARD_FILE_PREFIX}{data['index']}of{data['count']}")
+        for name in names:
+            source = os.path.join(directory, name)
+            if os.path.exists(source):
+                shutil.copy2(source, os.path.join(target_dir, name))
+                copied += 1
+    return copied
+
+
+def main():
+    parser = argparse.ArgumentParser(description='校验各分片合起来恰好覆盖输入一次，并可合并各分片的输出')
+    parser.add_argument('shard_dirs', nargs='+', help='各分片的输出目录（其中有 .shard_ 开头的分片清单）')
+    parser.add_argument('--input', required=True, help='输入：Excel 文件、JSON 文件夹或 records.jsonl 记录库')
+    parser.add_argument('--merge-into', default=None, help='校验通过后把各分片的输出文件复制到该目录')
+    args = parser.parse_args()
+
+    shard_files = []
+    for directory in args.shard_dirs:
+        shard_files.extend(read_shard_files(directory))
+    keys = input_keys(args.input)
+    problems = verify(keys, shard_files)
+    total = sum(len(data['keys']) for _, data in shard_files)
+    print(f"输入共 {len(set(keys))} 条记录，{len(shard_files)} 个分片清单共 {total} 条记录。")
+    if problems:
+        for problem in problems[:50]:
+            print(f"  {problem}")
+        if len(problems) > 50:
+            print(f"  ……共 {len(problems)} 个问题")
+        print("校验未通过。")
+        sys.exit(1)
+    print("校验通过：所有分片合起来恰好覆盖输入中的每条记录一次。")
+
+    if args.merge_into:
+        copied = merge(shard_files, args.merge_into)
+        print(f"已把 {copied} 个文件合并到 {args.merge_into}。")
+
+
+if __name__ == '__main__':
+    main()
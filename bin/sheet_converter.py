@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# 多工作表转换：工作簿中的每个工作表交给一个进程独立读取、转换和写出，
+# 多个工作表同时处理，整个工作簿的耗时接近最大的那个工作表的耗时，而不是所有工作表耗时之和
+
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from file_writer import BatchFileWriter, submit_json
+from excel_reader import chunk_to_records, sheet_names
+from manifest import Manifest, MANIFEST_NAME
+from record_store import RecordStoreWriter
+from scheduler import bounded_map
+from stage_timer import timer, call_with_timing
+from workbook_cache import open_chunk_reader, DEFAULT_MAX_BYTES
+
+# 'tag' 输出方式下，记录中标记所属工作表的字段
+SHEET_COLUMN = '工作表'
+
+# 子进程中的取消标志（multiprocessing.Event），由 _init_worker 在进程启动时设置
+_cancel_event = None
+
+
+# 进程初始化：保存主进程传入的取消标志
+def _init_worker(cancel_event):
+    global _cancel_event
+    _cancel_event = cancel_event
+
+
+# 函数：是否已被主进程取消
+def _cancelled():
+    return _cancel_event is not None and _cancel_event.is_set()
+
+
+# 函数：工作表名称转换为可用作目录名、文件名的字符串
+def sheet_dir_name(sheet):
+    return re.sub(r'[^\w\s-]', '', sheet).strip() or 'sheet'
+
+
+# 函数：确定要转换的工作表：'all' 为所有工作表，列表为指定的工作表（不存在的工作表报错）
+def select_sheets(file_path, sheets):
+    names = sheet_names(file_path)
+    if sheets == 'all':
+        return names
+    if isinstance(sheets, str):
+        sheets = [sheets]
+    missing = [sheet for sheet in sheets if sheet not in names]
+    if missing:
+        raise ValueError(f"工作簿中没有工作表：{', '.join(missing)}")
+    return list(sheets)
+
+
+# 函数：在子进程中转换一个工作表，返回统计结果；出错时返回错误信息，不影响其他工作表
+def convert_sheet(sheet, **options):
+    try:
+        return _convert_sheet(sheet, **options)
+    except Exception as e:
+        return {'sheet': sheet, 'error': str(e)}
+
+
+# 函数：转换一个工作表
+# sheet_output 为 'subdir' 时写入 output_dir/工作表名/；为 'tag' 时写入 output_dir，每条记录增加“工作表”字段，
+# 文件名（记录键）加上工作表名前缀（工作表名_总登记号），不同工作表中相同的总登记号或 row_行号 不会互相覆盖；
+# atomic=True 时 JSON 文件先写入临时文件再改名（可取消的转换使用，取消时不留下写了一半的文件）；
+# clean=True 时清理每个单元格的值（见 excel_reader.chunk_to_records，图形界面使用）
+def _convert_sheet(sheet, file_path, output_dir, sheet_output='subdir', output_mode='files', compact=False,
+                   incremental=True, batch_size=500, columns=None, cache_dir=None, cache_max_bytes=DEFAULT_MAX_BYTES,
+                   atomic=False, clean=False):
+    if _cancelled():
+        return {'sheet': sheet, 'cancelled': True, 'rows': 0, 'written': 0, 'removed': 0}
+    name = sheet_dir_name(sheet)
+    if sheet_output == 'subdir':
+        target_dir, manifest_name, store_name = os.path.join(output_dir, name), MANIFEST_NAME, 'records.jsonl'
+    else:
+        # 同一目录中每个工作表使用各自的清单和记录库，互不影响
+        target_dir, manifest_name, store_name = output_dir, f'{MANIFEST_NAME}_{name}', f'records_{name}.jsonl'
+    os.makedirs(target_dir, exist_ok=True)
+
+    store = RecordStoreWriter(os.path.join(target_dir, store_name)) if output_mode == 'jsonl' else None
+    manifest = Manifest(target_dir, name=manifest_name) if incremental and output_mode == 'files' else None
+    writer = BatchFileWriter(atomic=atomic) if store is None else None
+    rows = written = 0
+    removed = []
+    cancelled = False
+    with open_chunk_reader(file_path, batch_size, columns, cache_dir, cache_max_bytes, sheet) as reader:
+        try:
+            for chunk in timer.iterate('excel_parse', reader, count=len):
+                if _cancelled():
+                    cancelled = True
+                    if writer is not None:
+                        writer.cancel()
+                    break
+                with timer.stage('convert', len(chunk)):
+                    records = chunk_to_records(chunk, clean)
+                    if sheet_output == 'tag':
+                        for _, record in records:
+                            record[SHEET_COLUMN] = sheet
+                        records = [(f'{name}_{key}', record) for key, record in records]
+                rows += len(records)
+
+                if store is not None:
+                    with timer.stage('store_write', len(records)):
+                        store.write_many(records)
+                    continue
+                if manifest is not None:
+                    with timer.stage('manifest', len(records)):
+                        records = manifest.filter_changed(records, lambda key: os.path.join(target_dir, f'{key}.json'))
+                submit_json(writer, records, target_dir, compact)
+        finally:
+            if store is not None:
+                store.close()
+            if writer is not None:
+                writer.close()
+
+    errors = []
+    if writer is not None:
+        written, errors = writer.written, writer.errors
+        # 写入失败的行从清单中移除，下次重新写出
+        if manifest is not None:
+            for key in writer.failed_keys():
+                manifest.discard(key)
+
+    if manifest is not None and not cancelled:
+        # 删除工作表中已不存在的行对应的 JSON 文件（只涉及本工作表的清单）；取消时没有读完工作表，不删除也不保存清单
+        removed = manifest.remove_stale()
+        manifest.save()
+    result = {'sheet': sheet, 'output': target_dir, 'rows': rows, 'written': written, 'removed': len(removed)}
+    if cancelled:
+        result['cancelled'] = True
+    if errors:
+        result['error'] = f"{len(errors)} 个文件写入失败，如 {errors[0][0]}：{errors[0][1]}"
+    return result
+
+
+# 函数：多个进程同时转换多个工作表，按完成顺序返回每个工作表的统计结果；options 为 convert_sheet 的其余参数。
+# cancel_event 为 multiprocessing.Event，设置后各进程在读完当前一批后停止，尚未开始的工作表直接返回
+def convert_workbook(file_path, sheets, output_dir, max_workers, cancel_event=None, **options):
+    sheets = select_sheets(file_path, sheets)
+    # 工作表名清理后相同时，输出目录、清单和文件名前缀会冲突
+    names = {}
+    for sheet in sheets:
+        names.setdefault(sheet_dir_name(sheet), []).append(sheet)
+    clashes = [sheet_list for sheet_list in names.values() if len(sheet_list) > 1]
+    if clashes:
+        raise ValueError(f"以下工作表的名称去掉特殊字符后相同，输出会互相覆盖，请修改工作表名称："
+                         f"{'；'.join('、'.join(sheet_list) for sheet_list in clashes)}")
+    worker = partial(convert_sheet, file_path=file_path, output_dir=output_dir, **options)
+    # 开启计时时，子进程的各阶段耗时随结果一起返回
+    fn = partial(call_with_timing, worker) if timer.enabled else worker
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(sheets)) or 1,
+                             initializer=_init_worker, initargs=(cancel_event,)) as executor:
+        for _, result in bounded_map(executor, fn, sheets, max_workers):
+            if timer.enabled:
+                result, stats = result
+                timer.merge(stats)
+            yield result
@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# 分阶段计时：记录每个阶段（Excel 解析、数据转换、JSON 序列化、写文件、模板加载、占位符替换、保存 Word ...）
+# 的调用次数、处理条数、总耗时和耗时分布（p50/p99），运行结束后把汇总写入 log/ 目录的 JSON 文件。
+# 默认关闭；设置环境变量 YIHEYUAN_TIMING=1 后开启，关闭时开销可以忽略
+
+import os
+import json
+import math
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+# 环境变量开关
+TIMING_ENV = 'YIHEYUAN_TIMING'
+
+# 耗时分布按对数分桶（每桶约 9%），内存占用与调用次数无关，多个进程的结果可以直接相加
+_BUCKETS_PER_DOUBLING = 8
+_MIN_SECONDS = 1e-6
+
+
+# 函数：是否通过环境变量开启计时
+def timing_enabled():
+    return os.environ.get(TIMING_ENV, '') not in ('', '0')
+
+
+# 函数：耗时对应的桶编号
+def _bucket(seconds):
+    if seconds <= _MIN_SECONDS:
+        return 0
+    return int(math.log2(seconds / _MIN_SECONDS) * _BUCKETS_PER_DOUBLING) + 1
+
+
+# 函数：桶编号对应的耗时（取桶的上界）
+def _bucket_seconds(bucket):
+    return _MIN_SECONDS * 2 ** (bucket / _BUCKETS_PER_DOUBLING)
+
+
+class _Stage:
+    def __init__(self):
+        self.calls = 0
+        self.items = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.histogram = {}
+
+    def add(self, seconds, items):
+        self.calls += 1
+        self.items += items
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        bucket = _bucket(seconds)
+        self.histogram[bucket] = self.histogram.get(bucket, 0) + 1
+
+    def merge(self, data):
+        self.calls += data['calls']
+        self.items += data['items']
+        self.total += data['total']
+        self.max = max(self.max, data['max'])
+        for bucket, count in data['histogram'].items():
+            bucket = int(bucket)
+            self.histogram[bucket] = self.histogram.get(bucket, 0) + count
+
+    # 函数：按分布估算分位数（秒）
+    def percentile(self, p):
+        if not self.calls:
+            return 0.0
+        rank = math.ceil(self.calls * p / 100)
+        seen = 0
+        for bucket in sorted(self.histogram):
+            seen += self.histogram[bucket]
+            if seen >= rank:
+                return min(_bucket_seconds(bucket), self.max)
+        return self.max
+
+    def to_dict(self):
+        return {'calls': self.calls, 'items': self.items, 'total': self.total, 'max': self.max,
+                'histogram': self.histogram}
+
+
+class StageTimer:
+    def __init__(self, enabled=None):
+        # enabled 为 None 时按环境变量决定
+        self.enabled = timing_enabled() if enabled is None else enabled
+        self.stages = {}
+        self.counters = {}
+        self.started = time.perf_counter()
+        # 线程池中的任务也会计时
+        self._lock = threading.Lock()
+
+    def _add(self, name, seconds, items):
+        with self._lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = self.stages[name] = _Stage()
+            stage.add(seconds, items)
+
+    # 函数：记录一次阶段耗时；items 为这次处理的条数（如一批数据的行数）
+    def add(self, name, seconds, items=1):
+        if self.enabled:
+            self._add(name, seconds, items)
+
+    # 函数：计时一段代码，用法：with timer.stage('保存'): ...
+    @contextmanager
+    def stage(self, name, items=1):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._add(name, time.perf_counter() - start, items)
+
+    # 函数：对迭代器计时，每次取出下一项的耗时记为一次调用（用于 Excel 的逐批读取）；count 计算每项包含的条数
+    def iterate(self, name, iterable, count=None):
+        if not self.enabled:
+            yield from iterable
+            return
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self._add(name, time.perf_counter() - start, count(item) if count else 1)
+            yield item
+
+    # 函数：累加计数（如成功、失败的条数）
+    def count(self, name, n=1):
+        if self.enabled:
+            with self._lock:
+                self.counters[name] = self.counters.get(name, 0) + n
+
+    # 函数：取出当前的统计数据并清空，用于子进程把统计结果随任务结果一起返回给主进程
+    def drain(self):
+        with self._lock:
+            data = {'stages': {name: stage.to_dict() for name, stage in self.stages.items()},
+                    'counters': self.counters}
+            self.stages, self.counters = {}, {}
+        return data
+
+    # 函数：合并其他进程的统计数据
+    def merge(self, data):
+        if not self.enabled or not data:
+            return
+        with self._lock:
+            for name, stage in data['stages'].items():
+                self.stages.setdefault(name, _Stage()).merge(stage)
+            for name, n in data['counters'].items():
+                self.counters[name] = self.counters.get(name, 0) + n
+
+    # 函数：汇总结果（时间单位：总耗时为秒，单次耗时为毫秒）
+    def summary(self):
+        wall = time.perf_counter() - self.started
+        stages = {}
+        for name, stage in self.stages.items():
+            stages[name] = {
+                'calls': stage.calls,
+                'items': stage.items,
+                'total_seconds': round(stage.total, 4),
+                'share_of_wall': round(stage.total / wall, 4) if wall else None,
+                'items_per_second': round(stage.items / stage.total, 1) if stage.total else None,
+                'mean_ms': round(stage.total / stage.calls * 1000, 3) if stage.calls else 0,
+                'p50_ms': round(stage.percentile(50) * 1000, 3),
+                'p99_ms': round(stage.percentile(99) * 1000, 3),
+                'max_ms': round(stage.max * 1000, 3),
+            }
+        return {'wall_seconds': round(wall, 4), 'stages': stages, 'counters': self.counters}
+
+    # 函数：把汇总结果写入日志目录（timing_脚本名_时间.json），返回文件路径；未开启时不写
+    def save(self, log_dir, script_name):
+        if not self.enabled:
+            return None
+        os.makedirs(log_dir, exist_ok=True)
+        path = os.path.join(log_dir, f'timing_{script_name}_{datetime.now().strftime("%Y-%m-%d_%H-%M-%S")}.json')
+        data = {'script': script_name, 'pid': os.getpid(), 'time': datetime.now().isoformat(timespec='seconds')}
+        data.update(self.summary())
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=4)
+        return path
+
+    # 函数：可读的汇总文本（每个阶段一行），用于打印到控制台或日志
+    def report(self):
+        summary = self.summary()
+        lines = [f"总耗时 {summary['wall_seconds']:.2f} 秒"]
+        for name, s in sorted(summary['stages'].items(), key=lambda item: -item[1]['total_seconds']):
+            lines.append(f"  {name:<16} {s['total_seconds']:>9.3f} 秒  {s['calls']:>8} 次  {s['items']:>8} 条  "
+                         f"p50 {s['p50_ms']:.3f} ms  p99 {s['p99_ms']:.3f} ms")
+        for name, n in summary['counters'].items():
+            lines.append(f"  {name}: {n}")
+        return '\n'.join(lines)
+
+
+# 每个进程一个全局计时器，各模块共用
+timer = StageTimer()
+
+
+# 函数：在子进程中调用任务函数，并把本进程的统计数据随结果一起返回，返回 (结果, 统计数据)
+def call_with_timing(fn, *args):
+    result = fn(*args)
+    return result, timer.drain()
+
+
+# 函数：fork 出的子进程（进程池）清空从父进程复制来的统计数据，避免随结果返回时重复计入
+def _reset_after_fork():
+    timer.stages, timer.counters = {}, {}
+    timer._lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,336 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# 编译模板引擎：只解析一次 temp.docx，之后每条记录直接填充占位符槽位生成 Word 文件
+
+import io
+import os
+import re
+import struct
+import zipfile
+import zlib
+from xml.sax.saxutils import escape, unescape
+
+# 占位符与 JSON 字段的映射关系（占位符 -> Excel 列名）
+PLACEHOLDER_FIELDS = {
+    "year": "年",
+    "month": "月",
+    "day": "日",
+    "zongdengjihao": "总登记号",
+    "fenleihao": "分类号",
+    "name": "名称",
+    "niandai": "年代",
+    "jianshu": "件数",
+    "danwei": "单位",
+    "chicun": "尺寸",
+    "zhongliang": "重量",
+    "zhidi": "质地",
+    "wancanqingkuang": "完残情况",
+    "laiyuan": "来源",
+    "ruguanpingzhenghao": "入馆凭证号",
+    "zhuxiaopingzhenghao": "注销凭证号",
+    "jibie": "级别",
+    "beizhu": "备注",
+    "fuzeren": "负责人",
+    "danganbianhao": "档案编号",
+    "xingzhuangneirongmiaoshu": "形状内容描述",
+    "dangqianbaocuntiaojian": "当前保存条件",
+    "mingjitiba": "铭记题跋",
+}
+
+# Word 正文所在的包内部件
+DOCUMENT_PART = "word/document.xml"
+
+# 段落与文本节点的匹配规则
+_PARAGRAPH_RE = re.compile(r"<w:p(?=[\s>]).*?</w:p>", re.S)
+_TEXT_NODE_RE = re.compile(r"(<w:t(?:\s[^>]*)?>)([^<]*)(</w:t>)")
+
+# 合并文档时需要处理的正文结构：节属性、图形对象编号、书签、段落标识（w14:paraId / w14:textId，在文档中必须唯一）
+_SECT_PR_RE = re.compile(r"<w:sectPr\b.*?</w:sectPr>", re.S)
+_DOC_PR_ID_RE = re.compile(r'(<wp:docPr\b[^>]*?\bid=")(\d+)(")')
+_BOOKMARK_RE = re.compile(r"<w:bookmark(?:Start|End)\b[^>]*/>")
+_PARA_ID_RE = re.compile(r'\sw14:(?:paraId|textId)="[^"]*"')
+
+# 文本节点中可能出现的转义字符
+_XML_ENTITIES = {"&quot;": '"', "&apos;": "'"}
+
+
+class PlaceholderMatcher:
+    def __init__(self, placeholders=PLACEHOLDER_FIELDS):
+        # 长占位符优先，避免短占位符（如 name）截断其他占位符
+        self.placeholders = sorted(set(placeholders), key=len, reverse=True)
+        self.pattern = re.compile("|".join(re.escape(p) for p in self.placeholders))
+
+    def search(self, text):
+        return self.pattern.search(text)
+
+    def finditer(self, text):
+        return self.pattern.finditer(text)
+
+    # 函数：一次扫描替换文本中的全部占位符，返回新文本与命中的占位符；映射中没有的占位符保持原样
+    def substitute(self, text, mapping):
+        hits = []
+
+        def replace(match):
+            key = match.group(0)
+            value = mapping.get(key)
+            if value is None:
+                return key
+            hits.append(key)
+            return str(value)
+
+        return self.pattern.sub(replace, text), hits
+
+
+# 函数：在 python-docx 文档的段落和表格中替换占位符，每个文本节点只改写一次
+def fill_document(doc, mapping, matcher):
+    hits = []
+
+    def fill(item):
+        text = item.text
+        if not matcher.search(text):
+            return
+        new_text, item_hits = matcher.substitute(text, mapping)
+        if item_hits:
+            item.text = new_text
+            hits.extend(item_hits)
+
+    for paragraph in doc.paragraphs:
+        fill(paragraph)
+    for table in doc.tables:
+        for row in table.rows:
+            for cell in row.cells:
+                fill(cell)
+    return hits
+
+
+# ZIP 本地文件头、中央目录文件头和目录结束记录的格式
+_LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+_CENTRAL_HEADER = struct.Struct("<4s6H3L5H2L")
+_END_RECORD = struct.Struct("<4s4H2LH")
+
+
+# 函数：ZIP 条目时间转换为 DOS 格式的时间和日期
+def _dos_datetime(date_time):
+    year, month, day, hour, minute, second = date_time
+    return (hour << 11) | (minute << 5) | (second // 2), ((max(year, 1980) - 1980) << 9) | (month << 5) | day
+
+
+class _ZipMember:
+    # 一个已压缩好的 ZIP 条目：本地文件头 + 文件名 + 压缩数据可以原样写出
+    def __init__(self, info, method, crc, data, file_size):
+        self.name = info.filename.encode("utf-8")
+        self.flag = info.flag_bits & 0x800  # 只保留 UTF-8 文件名标志，大小直接写在本地文件头中
+        self.method = method
+        self.crc = crc
+        self.compress_size = len(data)
+        self.file_size = file_size
+        self.external_attr = info.external_attr
+        self.dostime, self.dosdate = _dos_datetime(info.date_time)
+        header = _LOCAL_HEADER.pack(b"PK\x03\x04", 20, self.flag, method, self.dostime, self.dosdate,
+                                    crc, self.compress_size, file_size, len(self.name), 0)
+        self.local_block = header + self.name + data
+
+    # 函数：中央目录中对应的文件头
+    def central_header(self, offset):
+        return _CENTRAL_HEADER.pack(b"PK\x01\x02", 20, 20, self.flag, self.method, self.dostime, self.dosdate,
+                                    self.crc, self.compress_size, self.file_size, len(self.name), 0, 0, 0, 0,
+                                    self.external_attr, offset) + self.name
+
+
+# 函数：读取模板包中每个条目压缩后的原始数据（不解压、不重新压缩）
+def _read_raw_members(path):
+    members, document = [], None
+    with zipfile.ZipFile(path) as zf, open(path, "rb") as f:
+        for info in zf.infolist():
+            if info.filename == DOCUMENT_PART:
+                # 正文部件每次都会重新生成，这里只记录位置
+                members.append(None)
+                document = (info, zf.read(info.filename))
+                continue
+            f.seek(info.header_offset)
+            header = _LOCAL_HEADER.unpack(f.read(_LOCAL_HEADER.size))
+            f.seek(header[9] + header[10], os.SEEK_CUR)
+            data = f.read(info.compress_size)
+            members.append(_ZipMember(info, info.compress_type, info.CRC, data, info.file_size))
+    return members, document
+
+
+# 函数：写出 ZIP 包
+def _write_zip(fp, members):
+    central, offset = [], 0
+    for member in members:
+        fp.write(member.local_block)
+        central.append(member.central_header(offset))
+        offset += len(member.local_block)
+    directory = b"".join(central)
+    fp.write(directory)
+    fp.write(_END_RECORD.pack(b"PK\x05\x06", 0, 0, len(members), len(members), len(directory), offset, 0))
+
+
+# 函数：为文本节点的起始标签加上 xml:space="preserve"，避免替换后首尾空格丢失
+def _preserve_space(open_tag):
+    if "xml:space" in open_tag:
+        return open_tag
+    return open_tag[:-1] + ' xml:space="preserve">'
+
+
+class CompiledTemplate:
+    # 正文部件的压缩级别（zlib 1-9，-1 为默认级别）
+    compress_level = -1
+
+    def __init__(self, template_path, placeholders=PLACEHOLDER_FIELDS):
+        self.template_path = template_path
+        self.placeholders = list(placeholders)
+        self.matcher = PlaceholderMatcher(self.placeholders)
+
+        # 一次性读取模板包中的所有部件；除正文外的部件保留压缩后的原始数据，生成文件时原样复制
+        self.members, (self.document_info, document_xml) = _read_raw_members(template_path)
+
+        # 编译正文：静态 XML 片段与占位符槽位交替排列
+        self.segments, self.slots = self._compile(document_xml.decode("utf-8"))
+
+    # 函数：占位符被拆分到多个文本节点时，把整段文字合并到第一个文本节点
+    def _merge_split_runs(self, paragraph):
+        nodes = list(_TEXT_NODE_RE.finditer(paragraph))
+        if len(nodes) < 2:
+            return paragraph
+        texts = [unescape(m.group(2), _XML_ENTITIES) for m in nodes]
+        full_text = "".join(texts)
+        # 每个占位符都完整落在单个节点内时无需合并
+        bounds, pos = [], 0
+        for text in texts:
+            bounds.append((pos, pos + len(text)))
+            pos += len(text)
+        split = False
+        for match in self.matcher.finditer(full_text):
+            if not any(start <= match.start() and match.end() <= end for start, end in bounds):
+                split = True
+                break
+        if not split:
+            return paragraph
+
+        parts, last = [], 0
+        for i, m in enumerate(nodes):
+            parts.append(paragraph[last:m.start()])
+            if i == 0:
+                parts.append(_preserve_space(m.group(1)) + escape(full_text) + m.group(3))
+            else:
+                parts.append(m.group(1) + m.group(3))
+            last = m.end()
+        parts.append(paragraph[last:])
+        return "".join(parts)
+
+    # 函数：扫描正文 XML，记录每个占位符所在的位置
+    def _compile(self, xml):
+        xml = _PARAGRAPH_RE.sub(lambda m: self._merge_split_runs(m.group(0)), xml)
+
+        segments, slots = [], []
+        buffer, last = [], 0
+        for node in _TEXT_NODE_RE.finditer(xml):
+            text = unescape(node.group(2), _XML_ENTITIES)
+            if not self.matcher.search(text):
+                continue
+            buffer.append(xml[last:node.start()])
+            buffer.append(_preserve_space(node.group(1)))
+            pos = 0
+            for match in self.matcher.finditer(text):
+                buffer.append(escape(text[pos:match.start()]))
+                segments.append("".join(buffer))
+                slots.append(match.group(0))
+                buffer = []
+                pos = match.end()
+            buffer.append(escape(text[pos:]))
+            buffer.append(node.group(3))
+            last = node.end()
+        buffer.append(xml[last:])
+        segments.append("".join(buffer))
+        return segments, slots
+
+    # 函数：按映射填充槽位，生成正文 XML；映射中没有的占位符保持原样
+    def render_document_xml(self, mapping):
+        parts = [self.segments[0]]
+        for slot, segment in zip(self.slots, self.segments[1:]):
+            value = mapping.get(slot)
+            parts.append(escape(slot if value is None else str(value)))
+            parts.append(segment)
+        return "".join(parts).encode("utf-8")
+
+    # 函数：把多条记录依次填入模板，合并为一个正文 XML，每条记录之间插入分节符（下一页）
+    def render_merged_xml(self, mappings):
+        bodies, head, tail, section_break = [], None, None, ""
+        for i, mapping in enumerate(mappings):
+            xml = self.render_document_xml(mapping).decode("utf-8")
+            body_start = xml.index(">", xml.index("<w:body")) + 1
+            sect_pr = list(_SECT_PR_RE.finditer(xml))[-1]
+            if head is None:
+                head, tail = xml[:body_start], xml[sect_pr.start():]
+                section_break = f"<w:p><w:pPr>{sect_pr.group(0)}</w:pPr></w:p>"
+            body = xml[body_start:sect_pr.start()]
+            if i > 0:
+                # 后续副本：图形对象编号错开，去掉重复的书签和段落标识（段落标识是可选属性，Word 打开时会重新生成）
+                body = _DOC_PR_ID_RE.sub(lambda m: f"{m.group(1)}{int(m.group(2)) + i * 10000}{m.group(3)}", body)
+                body = _BOOKMARK_RE.sub("", body)
+                body = _PARA_ID_RE.sub("", body)
+                bodies.append(section_break)
+            bodies.append(body)
+        if head is None:
+            raise ValueError("没有需要合并的记录")
+        return (head + "".join(bodies) + tail).encode("utf-8")
+
+    # 函数：多条记录合并生成一个 Word 文件（邮件合并）
+    def save_merged(self, mappings, output_path):
+        members = self._package_members(self.render_merged_xml(mappings))
+        with open(output_path, "wb") as f:
+            _write_zip(f, members)
+
+    # 函数：多条记录合并生成一个 Word 文件，返回文件内容（字节）
+    def render_merged_bytes(self, mappings):
+        buffer = io.BytesIO()
+        _write_zip(buffer, self._package_members(self.render_merged_xml(mappings)))
+        return buffer.getvalue()
+
+    # 函数：压缩正文部件，模板中的其他部件原样复制
+    def _package_members(self, document_xml):
+        compressor = zlib.compressobj(self.compress_level, zlib.DEFLATED, -15)
+        data = compressor.compress(document_xml) + compressor.flush()
+        document = _ZipMember(self.document_info, zipfile.ZIP_DEFLATED, zlib.crc32(document_xml), data, len(document_xml))
+        return [document if member is None else member for member in self.members]
+
+    # 函数：生成 Word 文件内容（字节）
+    def render_bytes(self, mapping):
+        buffer = io.BytesIO()
+        _write_zip(buffer, self._package_members(self.render_document_xml(mapping)))
+        return buffer.getvalue()
+
+    # 函数：生成并保存 Word 文件
+    def save(self, mapping, output_path):
+        self.save_document_xml(self.render_document_xml(mapping), output_path)
+
+    # 函数：把已填充的 document.xml 打包保存为 Word 文件（与 render_document_xml 分开调用时可分别计时）
+    def save_document_xml(self, document_xml, output_path):
+        members = self._package_members(document_xml)
+        with open(output_path, "wb") as f:
+            _write_zip(f, members)
+
+
+# 函数：模板中实际出现的占位符对应的数据列（按映射顺序），用于只读取需要的列
+def template_columns(template_path, placeholders=PLACEHOLDER_FIELDS):
+    used = set(get_compiled_template(template_path, placeholders).slots)
+    return [column for key, column in placeholders.items() if key in used]
+
+
+# 每个进程内缓存已编译的模板，模板文件修改后自动重新编译
+_template_cache = {}
+
+
+# 函数：获取（必要时编译）模板
+def get_compiled_template(template_path, placeholders=PLACEHOLDER_FIELDS):
+    stat = os.stat(template_path)
+    key = (os.path.abspath(template_path), stat.st_size, stat.st_mtime, tuple(placeholders))
+    template = _template_cache.get(key)
+    if template is None:
+        _template_cache.clear()
+        template = CompiledTemplate(template_path, placeholders)
+        _template_cache[key] = template
+    return template
@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# 工作表缓存：第一次读取 Excel 时把解析结果按列分块保存到本地缓存目录，
+# 同一个工作簿再次读取时直接加载缓存，不再用 openpyxl / xlrd 解析。
+# 缓存以 路径 + 大小 + 修改时间 + 内容哈希 为键，工作簿修改后自动失效；
+# 缓存目录有总大小上限，超过时删除最久未使用的缓存
+
+import os
+import pickle
+import hashlib
+
+import pandas as pd
+
+from excel_reader import ExcelChunkReader, select_columns
+from manifest import file_hash
+
+# 缓存文件后缀
+CACHE_SUFFIX = '.sheetcache'
+# 缓存格式版本，格式变化时旧缓存自动失效
+CACHE_VERSION = 2
+# 默认缓存目录总大小上限（字节）
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+
+# 函数：计算工作表的缓存键（路径、大小、修改时间、内容哈希、工作表）
+def cache_key(file_path, sheet=None):
+    stat = os.stat(file_path)
+    identity = f'{CACHE_VERSION}|{os.path.abspath(file_path)}|{stat.st_size}|{stat.st_mtime_ns}|{file_hash(file_path)}|{sheet!r}'
+    return hashlib.sha1(identity.encode('utf-8')).hexdigest()
+
+
+# 函数：删除最久未使用的缓存，直到缓存目录总大小不超过上限
+def evict(cache_dir, max_bytes):
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith(CACHE_SUFFIX):
+            path = os.path.join(cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # 其他进程同时在淘汰缓存
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
+
+
+# 函数：按固定大小重新分块（缓存中的分块大小可能与本次的批次大小不同）
+def _rechunk(frames, chunk_size):
+    pending, count = [], 0
+    for frame in frames:
+        pending.append(frame)
+        count += len(frame)
+        while count >= chunk_size:
+            data = pd.concat(pending) if len(pending) > 1 else pending[0]
+            yield data.iloc[:chunk_size]
+            rest = data.iloc[chunk_size:]
+            pending, count = ([rest], len(rest)) if len(rest) else ([], 0)
+    if pending:
+        yield pd.concat(pending) if len(pending) > 1 else pending[0]
+
+
+class CachedChunkReader:
+    # 与 ExcelChunkReader 接口相同（columns、total_rows、逐块迭代、close），数据来自缓存或在首次读取时写入缓存
+    def __init__(self, file_path, chunk_size, columns=None, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES, sheet=None):
+        self.file_path = file_path
+        self.chunk_size = chunk_size
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_path = os.path.join(cache_dir, cache_key(file_path, sheet) + CACHE_SUFFIX)
+        self._file = None
+        self._reader = None
+        self.hit = False
+
+        if os.path.exists(self.cache_path):
+            try:
+                self._file = open(self.cache_path, 'rb')
+                meta = pickle.load(self._file)
+                self.all_columns, self.total_rows = meta['columns'], meta['total_rows']
+                self.sheet_name = meta['sheet_name']
+                self.hit = True
+                # 更新使用时间，淘汰时按最久未使用的顺序删除
+                os.utime(self.cache_path)
+            except Exception:
+                # 缓存损坏时重新解析工作簿
+                self._close_file()
+
+        if not self.hit:
+            # 未命中：读取全部列写入缓存，缓存与列投影无关，可供不同的投影复用
+            self._reader = ExcelChunkReader(file_path, chunk_size, sheet=sheet)
+            self.all_columns, self.total_rows = self._reader.columns, self._reader.total_rows
+            self.sheet_name = self._reader.sheet_name
+
+        if columns is None:
+            self.columns = self.all_columns
+        else:
+            self.columns = [self.all_columns[i] for i in select_columns(self.all_columns, columns)]
+        self._project = self.columns != self.all_columns
+
+    # 函数：从缓存中逐块读取
+    def _load_frames(self):
+        while True:
+            try:
+                index, data = pickle.load(self._file)
+            except EOFError:
+                return
+            if self._project:
+                data = {name: data[name] for name in self.columns}
+            yield pd.DataFrame(data, index=index, columns=self.columns, dtype=object)
+
+    # 函数：解析工作簿，同时把每一块按列写入临时缓存文件；完整读取后才替换为正式缓存
+    def _parse_frames(self):
+        tmp_path = f'{self.cache_path}.{os.getpid()}.tmp'
+        complete = False
+        try:
+            with open(tmp_path, 'wb') as f:
+                meta = {'columns': self.all_columns, 'total_rows': self.total_rows, 'sheet_name': self.sheet_name}
+                pickle.dump(meta, f, pickle.HIGHEST_PROTOCOL)
+                for chunk in self._reader:
+                    data = {name: chunk[name].tolist() for name in self.all_columns}
+                    pickle.dump((chunk.index.tolist(), data), f, pickle.HIGHEST_PROTOCOL)
+                    yield chunk[self.columns] if self._project else chunk
+            complete = True
+        finally:
+            if complete:
+                os.replace(tmp_path, self.cache_path)
+                evict(self.cache_dir, self.max_bytes)
+            elif os.path.exists(tmp_path):
+                # 中途停止读取时不保留不完整的缓存
+                os.remove(tmp_path)
+
+    def __iter__(self):
+        if self.hit:
+            return _rechunk(self._load_frames(), self.chunk_size)
+        return self._parse_frames()
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def close(self):
+        self._close_file()
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# 函数：打开工作表的分块读取器；cache_dir 为 None 时不使用缓存
+def open_chunk_reader(file_path, chunk_size, columns=None, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES, sheet=None):
+    if cache_dir is None:
+        return ExcelChunkReader(file_path, chunk_size, columns, sheet)
+    return CachedChunkReader(file_path, chunk_size, columns, cache_dir, max_bytes, sheet)
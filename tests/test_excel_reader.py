@@ -0,0 +1,24 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import os
+import sys
+
+import pandas as pd
+
+# 使用 bin 目录中的模块
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'bin'))
+from excel_reader import chunk_to_records
+
+
+# 图形界面的清理：移除零宽度字符、去除首尾空白，空单元格为 None
+def test_chunk_to_records_clean():
+    chunk = pd.DataFrame([['\u200b A001 \ufeff', '  青花\u200d瓷瓶\t', float('nan')]],
+                         columns=['总登记号', '名称', '备注'], index=[0], dtype=object)
+    assert chunk_to_records(chunk, clean=True) == [('A001', {'总登记号': 'A001', '名称': '青花瓷瓶', '备注': None})]
+
+
+# 不清理时保持原来的输出：值原样转为字符串，空单元格为 'nan'
+def test_chunk_to_records_raw():
+    chunk = pd.DataFrame([[' A001 ', float('nan')]], columns=['总登记号', '备注'], index=[0], dtype=object)
+    assert chunk_to_records(chunk) == [('A001', {'总登记号': ' A001 ', '备注': 'nan'})]